@@ -0,0 +1,414 @@
+"""
+Readable aggregation core for the daily pipeline.
+
+Turns the show rows written by the bmsdaily shards (detailed1..9.json) into
+the finalsummary.json layout:
+
+    movies -> {shows, gross, sold, totalSeats, venues, cities, fastfilling,
+               housefull, occupancy, City_details, Language_details,
+               Format_details}
+
+Gross is accumulated in integer paise and every group keeps a per-venue
+show counter, so a show can be added *and removed* exactly.  That is what
+lets incremental_combine.py patch the aggregate instead of rebuilding it,
+while still producing the same bytes as a full rebuild.
+
+The detail lists come out in the order combine_dailyshards.py writes
+them: all shard rows (shard 1..9, file order) stably sorted by city and
+venue, each group placed where its first show lands.  A group keeps the
+first row index per (city, venue, shard); removals cannot lower a minimum
+back, so incremental_combine.py re-derives a shard's entries whenever it
+re-reads that shard (Aggregate.drop_places, then place() for every show).
+"""
+
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import pytz
+
+from json_stream import iter_rows
+
+IST = pytz.timezone("Asia/Kolkata")
+
+DATA_DIR = Path("daily") / "data"
+SHARD_COUNT = 9
+
+FASTFILLING_MIN = 50   # occupancy % of a single show
+HOUSEFULL_MIN = 98
+
+
+# ---------------------------------------------------------------------------
+# Paths / IO
+# ---------------------------------------------------------------------------
+
+def today_ist():
+    return datetime.now(IST).strftime("%Y%m%d")
+
+
+def now_ist_label():
+    return datetime.now(IST).strftime("%Y-%m-%d %H:%M IST")
+
+
+def day_dir(date, data_dir=DATA_DIR):
+    return Path(data_dir) / date
+
+
+def shard_paths(folder, shard_count=SHARD_COUNT):
+    """detailedN.json files present in ``folder``, in shard order."""
+    paths = []
+    for n in range(1, shard_count + 1):
+        p = Path(folder) / f"detailed{n}.json"
+        if p.exists():
+            paths.append(p)
+    return paths
+
+
+def shard_number(path):
+    """9 for detailed9.json; 0 for anything else (finaldetailed.json)."""
+    digits = Path(path).stem[len("detailed"):]
+    return int(digits) if digits.isdigit() else 0
+
+
+def load_rows(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    # finaldetailed.json wraps the rows as {"last_updated": .., "data": [..]}
+    if isinstance(data, dict):
+        data = data.get("data", [])
+    return data
+
+
+def write_json(path, obj):
+    """Atomic pretty-printed write, same formatting as the shard scripts."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def dump_bytes(obj):
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+# ---------------------------------------------------------------------------
+# Show -> contribution
+# ---------------------------------------------------------------------------
+
+def show_band(sold, seats):
+    """0 = normal, 1 = fastfilling, 2 = housefull."""
+    if not seats:
+        return 0
+    occ = sold / seats * 100
+    if occ >= HOUSEFULL_MIN:
+        return 2
+    if occ >= FASTFILLING_MIN:
+        return 1
+    return 0
+
+
+def contribution(row, shard=0, index=0):
+    """
+    The part of a show row that feeds the summary, as a flat tuple:
+    (movie, city, state, language, dimension, venue, sold, seats,
+     gross_paise, band, shard, index).  ``shard`` and ``index`` place the
+    row among all rows of the day; they only decide the detail order.
+    """
+    sold = int(row.get("sold") or 0)
+    seats = int(row.get("totalSeats") or 0)
+    return (
+        row.get("movie") or "",
+        (row.get("city") or "").title(),
+        (row.get("state") or "").title(),
+        (row.get("language") or "").upper(),
+        row.get("dimension") or "",
+        row.get("venue") or "",
+        sold,
+        seats,
+        round(float(row.get("gross") or 0) * 100),
+        show_band(sold, seats),
+        shard,
+        index,
+    )
+
+
+def session_key(row):
+    """
+    Identity of a show across runs, for matching a shard's rows with its
+    previous snapshot.  District rows carry no session_id, so the show
+    identity is spelled out.
+    """
+    return "|".join(str(row.get(k) or "") for k in (
+        "source", "venue", "movie", "session_id", "time", "audi",
+        "language", "dimension"))
+
+
+# ---------------------------------------------------------------------------
+# Accumulators
+# ---------------------------------------------------------------------------
+
+class Totals:
+    __slots__ = ("shows", "gross", "sold", "seats", "fastfilling",
+                 "housefull", "venues")
+
+    def __init__(self):
+        self.shows = 0
+        self.gross = 0          # paise
+        self.sold = 0
+        self.seats = 0
+        self.fastfilling = 0
+        self.housefull = 0
+        self.venues = Counter()
+
+    def add(self, c, sign=1):
+        self.shows += sign
+        self.sold += sign * c[6]
+        self.seats += sign * c[7]
+        self.gross += sign * c[8]
+        if c[9] == 1:
+            self.fastfilling += sign
+        elif c[9] == 2:
+            self.housefull += sign
+        self.venues[c[5]] += sign
+        if self.venues[c[5]] <= 0:
+            del self.venues[c[5]]
+
+    def block(self):
+        occ = round(self.sold / self.seats * 100, 2) if self.seats else 0.0
+        return {
+            "venues": len(self.venues),
+            "shows": self.shows,
+            "gross": round(self.gross / 100, 2),
+            "sold": self.sold,
+            "totalSeats": self.seats,
+            "fastfilling": self.fastfilling,
+            "housefull": self.housefull,
+            "occupancy": occ,
+        }
+
+    def to_state(self):
+        return [self.shows, self.gross, self.sold, self.seats,
+                self.fastfilling, self.housefull, dict(self.venues)]
+
+    @classmethod
+    def from_state(cls, s):
+        t = cls()
+        (t.shows, t.gross, t.sold, t.seats,
+         t.fastfilling, t.housefull, venues) = s
+        t.venues = Counter(venues)
+        return t
+
+
+class Group(Totals):
+    """
+    Totals of one detail row, plus {(city, venue, shard): first row index}
+    of its shows; the smallest (city, venue, shard, index) places the row.
+    """
+    __slots__ = ("places",)
+
+    def __init__(self):
+        super().__init__()
+        self.places = {}
+
+    def add(self, c, sign=1):
+        super().add(c, sign)
+        if sign > 0:
+            self.place(c)
+
+    def place(self, c):
+        key = (c[1], c[5], c[10])
+        index = self.places.get(key)
+        if index is None or c[11] < index:
+            self.places[key] = c[11]
+
+    def drop_shard(self, shard):
+        self.places = {k: i for k, i in self.places.items() if k[2] != shard}
+
+    def first(self):
+        return min((*k, i) for k, i in self.places.items())
+
+    def to_state(self):
+        return super().to_state() + [[*k, i] for k, i in self.places.items()]
+
+    @classmethod
+    def from_state(cls, s):
+        t = super().from_state(s[:7])
+        t.places = {tuple(p[:3]): p[3] for p in s[7:]}
+        return t
+
+
+class MovieTotals:
+    __slots__ = ("total", "city_names", "cities", "languages", "formats")
+
+    def __init__(self):
+        self.total = Totals()
+        self.city_names = Counter()
+        self.cities = {}
+        self.languages = {}
+        self.formats = {}
+
+    @staticmethod
+    def _bump(groups, key, c, sign):
+        t = groups.get(key)
+        if t is None:
+            t = groups[key] = Group()
+        t.add(c, sign)
+        if t.shows <= 0:
+            del groups[key]
+
+    def add(self, c, sign=1):
+        self.total.add(c, sign)
+        self.city_names[c[1]] += sign
+        if self.city_names[c[1]] <= 0:
+            del self.city_names[c[1]]
+        self._bump(self.cities, (c[1], c[2]), c, sign)
+        self._bump(self.languages, c[3], c, sign)
+        self._bump(self.formats, c[4], c, sign)
+
+    def head(self):
+        """The movie's own totals, without the detail lists."""
+        head = self.total.block()
+        return {
+            "shows": head["shows"],
+            "gross": head["gross"],
+            "sold": head["sold"],
+            "totalSeats": head["totalSeats"],
+            "venues": head["venues"],
+            "cities": len(self.city_names),
+            "fastfilling": head["fastfilling"],
+            "housefull": head["housefull"],
+            "occupancy": head["occupancy"],
+        }
+
+    def block(self):
+        out = self.head()
+        out["City_details"] = [
+            {"city": city, "state": state, **t.block()}
+            for (city, state), t in _in_order(self.cities)
+        ]
+        out["Language_details"] = [
+            {"language": k, **t.block()} for k, t in _in_order(self.languages)
+        ]
+        out["Format_details"] = [
+            {"dimension": k, **t.block()} for k, t in _in_order(self.formats)
+        ]
+        return out
+
+
+def _in_order(groups):
+    # Where the group's first show lands in the sorted rows; the key only
+    # breaks a tie that cannot happen (one show sits in one group).
+    return sorted(groups.items(), key=lambda kv: (kv[1].first(), kv[0]))
+
+
+class Aggregate:
+    """All movies of one day.  ``add``/``remove`` take contribution tuples."""
+
+    def __init__(self):
+        self.movies = {}
+
+    def add(self, c, sign=1):
+        m = self.movies.get(c[0])
+        if m is None:
+            m = self.movies[c[0]] = MovieTotals()
+        m.add(c, sign)
+        if m.total.shows <= 0:
+            del self.movies[c[0]]
+
+    def remove(self, c):
+        self.add(c, -1)
+
+    def drop_places(self, shard):
+        """
+        Forget every place in ``shard``; the shard's current shows then go
+        through add() or place() again.  Needed after removals from a shard.
+        """
+        for m in self.movies.values():
+            for groups in (m.cities, m.languages, m.formats):
+                for g in groups.values():
+                    g.drop_shard(shard)
+
+    def place(self, c):
+        """Record where an already counted show sorts."""
+        m = self.movies[c[0]]
+        m.cities[(c[1], c[2])].place(c)
+        m.languages[c[3]].place(c)
+        m.formats[c[4]].place(c)
+
+    def add_rows(self, rows, shard=0):
+        for i, row in enumerate(rows):
+            self.add(contribution(row, shard, i))
+        return self
+
+    def summary(self, last_updated):
+        return {
+            "last_updated": last_updated,
+            "movies": {name: self.movies[name].block()
+                       for name in sorted(self.movies)},
+        }
+
+    # -- persistence (used by the incremental combiner) --
+
+    def to_state(self):
+        out = {}
+        for name, m in self.movies.items():
+            out[name] = {
+                "total": m.total.to_state(),
+                "city_names": dict(m.city_names),
+                "cities": [[c, s, t.to_state()]
+                           for (c, s), t in m.cities.items()],
+                "languages": {k: t.to_state() for k, t in m.languages.items()},
+                "formats": {k: t.to_state() for k, t in m.formats.items()},
+            }
+        return out
+
+    @classmethod
+    def from_state(cls, state):
+        agg = cls()
+        for name, s in state.items():
+            m = MovieTotals()
+            m.total = Totals.from_state(s["total"])
+            m.city_names = Counter(s["city_names"])
+            m.cities = {(c, st): Group.from_state(t)
+                        for c, st, t in s["cities"]}
+            m.languages = {k: Group.from_state(t)
+                           for k, t in s["languages"].items()}
+            m.formats = {k: Group.from_state(t)
+                         for k, t in s["formats"].items()}
+            agg.movies[name] = m
+        return agg
+
+
+def movie_summary(rows, details=False):
+    """
+    One shard's movie_summaryN.json: movie totals in order of first
+    appearance in the shard.  The BMS shards write no detail lists; the
+    district shard (movie_summary9.json) also lists City/Language/Format
+    details, which ``details=True`` adds (with the city, state and language
+    spelled as finalsummary.json does).
+    """
+    agg = Aggregate()
+    for row in rows:
+        agg.add(contribution(row))
+    if details:
+        return {name: m.block() for name, m in agg.movies.items()}
+    return {name: m.head() for name, m in agg.movies.items()}
+
+
+def build_summary(paths, last_updated=None, sink=None):
+    """
+    Full rebuild: stream every shard and aggregate from scratch.  Rows are
+    also handed to ``sink.write`` (a json_stream writer) when given, so a
+    combined detail file costs no extra memory.
+    """
+    agg = Aggregate()
+    for p in paths:
+        shard = shard_number(p)
+        for i, row in enumerate(iter_rows(p)):
+            agg.add(contribution(row, shard, i))
+            if sink is not None:
+                sink.write(row)
+    return agg.summary(last_updated or now_ist_label())
@@ -0,0 +1,613 @@
+"""
+Shared async HTTP layer for the bmsdaily shard scrapers.
+
+One FetchPool per process holds one aiohttp.ClientSession (keep-alive,
+DNS cache) and puts every request through:
+
+  * a per-host AIMD limiter: the allowed concurrency grows by ~1 per
+    window of successful, fast responses and is halved (at most once per
+    cooldown) on 429s, a rising error rate or latency well above the
+    host's baseline;
+  * retries with full jitter for connection errors, timeouts, 429 and
+    5xx (Retry-After is honoured);
+  * coalescing: concurrent requests for the same canonical URL share one
+    fetch, and a small LRU serves repeated venue/date lookups.  The fetch
+    runs as its own task, so a caller that is cancelled does not take it
+    away from the others.
+
+FETCH_MODE selects live (default), record (live + append every response
+to the cassette) or replay (answer from the cassette, no network).  The
+cassette is JSON Lines, replay/requests.jsonl unless FETCH_CASSETTE says
+otherwise.  FETCH_REDIRECT=http://127.0.0.1:8765 sends all traffic to the
+local mock server, which serves the cassette (or synthetic bodies) with
+configurable latency, capacity and error rate.  When FETCH_METRICS names a
+file (run_metrics.py sets it), close() appends the pool's summary to it.
+
+Usage:
+    python fetch_pool.py serve [--cassette PATH] [--port 8765]
+                               [--latency-ms 80] [--capacity 24] [--error-rate 0.01]
+    python fetch_pool.py bench [--requests 2000] [--fixed 4 8 16 32]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import sys
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import aiohttp
+
+from latency import busy_time, percentile
+
+REPLAY_FILE = Path("replay") / "requests.jsonl"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+HOST_HEADER = "X-Fetch-Host"
+
+
+def request_key(url, params=None):
+    """Canonical GET URL: query from ``url`` and ``params`` merged and sorted."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query += [(k, str(v)) for k, v in params.items()]
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path or "/",
+                       urlencode(sorted(query)), ""))
+
+
+class Response:
+    __slots__ = ("status", "content_type", "body", "elapsed", "source")
+
+    def __init__(self, status, content_type, body, elapsed=0.0, source="live"):
+        self.status = status
+        self.content_type = content_type
+        self.body = body            # bytes
+        self.elapsed = elapsed
+        self.source = source        # live / replay / memo
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    def text(self):
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class ReplayMiss(KeyError):
+    """Replay mode was asked for a URL the cassette does not have."""
+
+
+# ---------------------------------------------------------------------------
+# Adaptive per-host limit
+# ---------------------------------------------------------------------------
+
+class AIMDLimiter:
+    """
+    Concurrency limit for one host.  ``limit`` is a float; ``int(limit)``
+    requests may be in flight.  Until the first congestion signal every
+    success adds 1 (slow start, doubling per window); after that success
+    adds 1/limit (about +1 per full window).  Congestion -- a 429, a
+    response ``tolerance`` times slower than the baseline, or more than
+    ``error_budget`` of the last 50 requests failing -- multiplies the
+    limit by ``decrease``, at most once per ``cooldown`` seconds.
+    """
+
+    def __init__(self, start=8, floor=1, ceiling=64, decrease=0.5,
+                 tolerance=3.0, slow_floor=0.25, error_budget=0.1, cooldown=1.0):
+        self.limit = float(start)
+        self.floor = floor
+        self.ceiling = ceiling
+        self.decrease = decrease
+        self.tolerance = tolerance      # "slow" = tolerance x baseline latency
+        self.slow_floor = slow_floor    # ...but never below this many seconds
+        self.error_budget = error_budget  # failed share of recent requests
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.baseline = None
+        self.cuts = 0
+        self.peak = self.limit
+        self._recent = deque(maxlen=50)
+        self._outcomes = deque(maxlen=50)
+        self._last_cut = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < max(1, int(self.limit)))
+            self.in_flight += 1
+
+    async def release(self, ok, latency, throttled=False):
+        async with self._cond:
+            self.in_flight -= 1
+            self._observe(ok, latency, throttled)
+            self._cond.notify_all()
+
+    def _observe(self, ok, latency, throttled=False):
+        self._outcomes.append(ok)
+        if ok:
+            self._recent.append(latency)
+            # baseline: the fastest recent response (uncongested round trip)
+            self.baseline = min(self._recent)
+        slow = (self.baseline is not None
+                and latency > max(self.slow_floor, self.baseline * self.tolerance))
+        # a stray 5xx or timeout is noise; a run of them is congestion
+        failing = (len(self._outcomes) >= 10 and
+                   self._outcomes.count(False) / len(self._outcomes) > self.error_budget)
+        if not (throttled or slow or failing):
+            if ok:
+                step = 1 if not self.cuts else 1 / self.limit
+                self.limit = min(self.ceiling, self.limit + step)
+                self.peak = max(self.peak, self.limit)
+            return
+        now = time.monotonic()
+        if now - self._last_cut >= self.cooldown:
+            self.limit = max(self.floor, self.limit * self.decrease)
+            self._last_cut = now
+            self.cuts += 1
+
+
+class FixedLimiter(AIMDLimiter):
+    """Same interface, constant limit (for comparison runs)."""
+
+    def __init__(self, limit):
+        super().__init__(start=limit, floor=limit, ceiling=limit)
+
+    def _observe(self, ok, latency, throttled=False):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Cassette
+# ---------------------------------------------------------------------------
+
+class Cassette:
+    """requests.jsonl: one {"key", "status", "content_type", "body", ...} per line."""
+
+    def __init__(self, path=REPLAY_FILE):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        e = json.loads(line)
+                        self.entries[e["key"]] = e
+
+    @staticmethod
+    def to_response(e, source="replay"):
+        body = (base64.b64decode(e["body"]) if e.get("encoding") == "base64"
+                else e["body"].encode("utf-8"))
+        return Response(e["status"], e.get("content_type", ""), body,
+                        e.get("elapsed", 0.0), source)
+
+    def get(self, key):
+        e = self.entries.get(key)
+        return None if e is None else self.to_response(e)
+
+    def append(self, key, resp):
+        try:
+            body, encoding = resp.body.decode("utf-8"), None
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(resp.body).decode("ascii"), "base64"
+        e = {"key": key, "status": resp.status, "content_type": resp.content_type,
+             "elapsed": round(resp.elapsed, 4), "body": body}
+        if encoding:
+            e["encoding"] = encoding
+        self.entries[key] = e
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+
+
+# ---------------------------------------------------------------------------
+# Pool
+# ---------------------------------------------------------------------------
+
+class FetchPool:
+    """
+    async with FetchPool() as pool:
+        data = await pool.get_json(url, params={...})
+    """
+
+    def __init__(self, mode="live", cassette=REPLAY_FILE, redirect=None,
+                 headers=None, cookies=None, start_limit=8, max_limit=64,
+                 fixed_limit=None, retries=4, backoff=0.5, backoff_cap=20.0,
+                 timeout=30, total_connections=100, memo_size=256,
+                 replay_speed=0.0):
+        if mode not in ("live", "record", "replay"):
+            raise ValueError(f"unknown fetch mode {mode!r}")
+        self.mode = mode
+        self.cassette = Cassette(cassette) if mode != "live" else None
+        self.redirect = redirect.rstrip("/") if redirect else None
+        self.headers = dict(headers or {})
+        self.cookies = dict(cookies or {})
+        self.start_limit = start_limit
+        self.max_limit = max_limit
+        self.fixed_limit = fixed_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.total_connections = total_connections
+        self.replay_speed = replay_speed
+        self.limiters = {}
+        self.session = None
+        self._inflight = {}
+        self._memo = OrderedDict()
+        self._memo_size = memo_size
+        self.stats = {"requests": 0, "attempts": 0, "retries": 0, "errors": 0,
+                      "coalesced": 0, "memo_hits": 0, "replayed": 0, "bytes": 0}
+        self.latencies = []
+        self.spans = []
+        self._reported = False
+
+    @classmethod
+    def from_env(cls, **kw):
+        kw.setdefault("mode", os.environ.get("FETCH_MODE", "live"))
+        kw.setdefault("cassette", os.environ.get("FETCH_CASSETTE", REPLAY_FILE))
+        kw.setdefault("redirect", os.environ.get("FETCH_REDIRECT") or None)
+        return cls(**kw)
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        if self.session is None and self.mode != "replay":
+            connector = aiohttp.TCPConnector(limit=self.total_connections,
+                                             ttl_dns_cache=300,
+                                             keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(
+                connector=connector, headers=self.headers, cookies=self.cookies,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def close(self):
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        self.report_metrics()
+
+    def limiter(self, host):
+        lim = self.limiters.get(host)
+        if lim is None:
+            lim = self.limiters[host] = (
+                FixedLimiter(self.fixed_limit) if self.fixed_limit
+                else AIMDLimiter(start=self.start_limit, ceiling=self.max_limit))
+        return lim
+
+    # -- public API --
+
+    async def get(self, url, params=None, headers=None):
+        key = request_key(url, params)
+        self.stats["requests"] += 1
+
+        hit = self._memo.get(key)
+        if hit is not None:
+            self._memo.move_to_end(key)
+            self.stats["memo_hits"] += 1
+            return hit
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            # the first caller's spelling goes out; the key only coalesces
+            task = asyncio.ensure_future(self._fetch(key, url, params, headers))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._settle(key, t))
+        # shield: cancelling this caller must not cancel the shared fetch
+        return await asyncio.shield(task)
+
+    def _settle(self, key, task):
+        del self._inflight[key]
+        # exception() also marks it retrieved when every caller is gone
+        if task.cancelled() or task.exception() is not None:
+            return
+        resp = task.result()
+        if resp.ok and self._memo_size:
+            self._memo[key] = resp
+            if len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+
+    async def get_json(self, url, params=None, headers=None):
+        return (await self.get(url, params, headers)).json()
+
+    async def get_text(self, url, params=None, headers=None):
+        return (await self.get(url, params, headers)).text()
+
+    def summary(self):
+        out = dict(self.stats)
+        for pct in (50, 95, 99):
+            v = percentile(self.latencies, pct)
+            out[f"p{pct}_ms"] = None if v is None else round(v * 1000, 1)
+        out["busy_s"] = round(busy_time(self.spans), 3)
+        out["hosts"] = {h: {"limit": round(l.limit, 2), "peak": round(l.peak, 2),
+                            "cuts": l.cuts} for h, l in self.limiters.items()}
+        return out
+
+    def report_metrics(self, path=None):
+        """
+        Append summary() as one JSON line to ``path`` (default: the
+        FETCH_METRICS file run_metrics.py hands to the scripts it runs).
+        Once per pool, and only if it fetched anything.
+        """
+        path = path or os.environ.get("FETCH_METRICS")
+        if not path or self._reported or not self.stats["requests"]:
+            return
+        self._reported = True
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.summary()) + "\n")
+
+    # -- internals --
+
+    async def _fetch(self, key, url, params, headers):
+        if self.mode == "replay":
+            resp = self.cassette.get(key)
+            if resp is None:
+                raise ReplayMiss(key)
+            if self.replay_speed:
+                await asyncio.sleep(resp.elapsed * self.replay_speed)
+            self.stats["replayed"] += 1
+            self.latencies.append(resp.elapsed)
+            return resp
+
+        resp = await self._fetch_live(key, url, params, headers)
+        if self.mode == "record":
+            self.cassette.append(key, resp)
+        return resp
+
+    def _target(self, key, url):
+        """
+        (URL to send, host for the limiter, extra headers).  ``url`` goes
+        out as the caller wrote it; the canonical ``key`` only names the host.
+        """
+        host = urlsplit(key).netloc
+        if not self.redirect:
+            return url, host, None
+        parts = urlsplit(url)
+        return self.redirect + urlunsplit(("", "", parts.path, parts.query, "")), \
+            host, {HOST_HEADER: parts.netloc}
+
+    async def _fetch_live(self, key, url, params, headers):
+        url, host, extra = self._target(key, url)
+        if extra:
+            headers = {**(headers or {}), **extra}
+        lim = self.limiter(host)
+        last_exc = None
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+            self.stats["attempts"] += 1
+            retry_after = None
+            await lim.acquire()
+            t0 = time.perf_counter()
+            try:
+                async with self.session.get(url, params=params, headers=headers) as r:
+                    body = await r.read()
+                    elapsed = time.perf_counter() - t0
+                    resp = Response(r.status, r.headers.get("Content-Type", ""),
+                                    body, elapsed)
+                    retry_after = r.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                t1 = time.perf_counter()
+                self.spans.append((t0, t1))
+                await lim.release(False, t1 - t0)
+                self.stats["errors"] += 1
+                last_exc = e
+            except BaseException:
+                # a bad argument, a cancellation...: the slot still has to
+                # go back, or every later request to the host waits forever
+                await lim.release(False, time.perf_counter() - t0)
+                raise
+            else:
+                congested = resp.status in RETRY_STATUSES
+                await lim.release(not congested, elapsed, resp.status == 429)
+                self.latencies.append(elapsed)
+                self.spans.append((t0, t0 + elapsed))
+                self.stats["bytes"] += len(body)
+                if not congested or attempt == self.retries:
+                    return resp
+                self.stats["errors"] += 1
+            if attempt < self.retries:
+                await asyncio.sleep(self._delay(attempt, retry_after))
+
+        raise last_exc
+
+    def _delay(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(self.backoff_cap, float(retry_after))
+            except ValueError:
+                pass
+        # "full jitter": uniform over the exponential window
+        return random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** attempt))
+
+
+def session_from_cloudscraper(scraper):
+    """
+    Headers and cookies of a cloudscraper session that passed the challenge,
+    as FetchPool(headers=..., cookies=...) arguments.
+    """
+    return ({"User-Agent": scraper.headers.get("User-Agent", "")},
+            {c.name: c.value for c in scraper.cookies})
+
+
+_shared = None
+
+
+async def shared_pool(**kw):
+    """The process-wide pool (created on first use, configured from env)."""
+    global _shared
+    if _shared is None:
+        _shared = await FetchPool.from_env(**kw).open()
+    return _shared
+
+
+async def close_shared_pool():
+    global _shared
+    if _shared is not None:
+        await _shared.close()
+        _shared = None
+
+
+# ---------------------------------------------------------------------------
+# Local mock server
+# ---------------------------------------------------------------------------
+
+def make_app(cassette=None, latency_ms=80, capacity=24, error_rate=0.0,
+             body_kb=8, seed=0):
+    """
+    aiohttp app standing in for the live site.  Up to ``capacity`` requests
+    are served at ``latency_ms``; beyond that latency grows with the queue
+    and requests over twice the capacity are refused with 429.
+    """
+    from aiohttp import web
+
+    rng = random.Random(seed)
+    entries = Cassette(cassette).entries if cassette else {}
+    state = {"in_flight": 0, "served": 0, "refused": 0, "failed": 0, "peak": 0,
+             "last_path": None}
+    filler = ("x" * 1024) * body_kb
+
+    async def handle(request):
+        host = request.headers.get(HOST_HEADER, request.host)
+        key = request_key(f"https://{host}{request.path_qs}")
+        state["last_path"] = request.raw_path
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            load = state["in_flight"] / capacity
+            if load > 2:
+                state["refused"] += 1
+                return web.Response(status=429, headers={"Retry-After": "1"})
+            await asyncio.sleep(latency_ms / 1000 * max(1.0, load))
+            if rng.random() < error_rate * max(1.0, load):
+                state["failed"] += 1
+                return web.Response(status=503)
+            state["served"] += 1
+            e = entries.get(key)
+            if e is not None:
+                resp = Cassette.to_response(e)
+                return web.Response(status=resp.status, body=resp.body,
+                                    content_type=(resp.content_type or "text/plain")
+                                    .split(";")[0])
+            return web.json_response({"key": key, "data": filler})
+        finally:
+            state["in_flight"] -= 1
+
+    app = web.Application()
+    app["state"] = state
+    app.router.add_route("GET", "/{tail:.*}", handle)
+    return app
+
+
+async def _start(app, port=0):
+    from aiohttp import web
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def serve(args):
+    from aiohttp import web
+    app = make_app(args.cassette, args.latency_ms, args.capacity, args.error_rate)
+    print(f"✅ Mock server on http://127.0.0.1:{args.port} "
+          f"(cassette: {args.cassette or 'synthetic'})")
+    web.run_app(app, host="127.0.0.1", port=args.port, access_log=None, print=None)
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Offline benchmark
+# ---------------------------------------------------------------------------
+
+def workload(n, venues=600, dates=2, dup=0.2, seed=0):
+    """Venue/date lookups, ``dup`` of them repeats of an earlier one."""
+    rng = random.Random(seed)
+    urls = []
+    for _ in range(n):
+        if urls and rng.random() < dup:
+            urls.append(rng.choice(urls))
+        else:
+            urls.append(f"https://in.bookmyshow.com/api/venue?code=V{rng.randrange(venues):04d}"
+                        f"&date=2026021{rng.randrange(dates)}")
+    return urls
+
+
+async def _run(urls, redirect, **pool_kw):
+    t0 = time.perf_counter()
+    async with FetchPool(redirect=redirect, backoff=0.1, **pool_kw) as pool:
+        results = await asyncio.gather(*(pool.get(u) for u in urls),
+                                       return_exceptions=True)
+    wall = time.perf_counter() - t0
+    failed = sum(1 for r in results if isinstance(r, BaseException) or not r.ok)
+    return wall, failed, pool.summary()
+
+
+async def _bench(args):
+    rows = []
+    urls = workload(args.requests, dup=args.dup)
+    configs = [("fixed", n) for n in args.fixed] + [("aimd", None)]
+    for kind, n in configs:
+        app = make_app(None, args.latency_ms, args.capacity, args.error_rate)
+        runner, base = await _start(app)
+        try:
+            wall, failed, s = await _run(urls, base, fixed_limit=n,
+                                         start_limit=args.start, memo_size=0)
+        finally:
+            await runner.cleanup()
+        state = app["state"]
+        host = next(iter(s["hosts"].values()), {})
+        rows.append((f"{kind} {n}" if n else f"aimd {args.start}->",
+                     wall, len(urls) / wall, s["p50_ms"], s["p95_ms"], s["retries"],
+                     s["coalesced"], failed, state["peak"], host.get("limit")))
+
+    print(f"{len(urls)} lookups ({args.dup:.0%} duplicates), server capacity "
+          f"{args.capacity}, latency {args.latency_ms} ms, errors {args.error_rate:.1%}")
+    print(f"{'config':<12} {'wall s':>7} {'req/s':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'retries':>7} {'shared':>7} {'failed':>6} {'peak':>5} {'limit':>6}")
+    for name, wall, rps, p50, p95, retries, shared, failed, peak, limit in rows:
+        print(f"{name:<12} {wall:>7.2f} {rps:>7.0f} {p50:>7} {p95:>7} "
+              f"{retries:>7} {shared:>7} {failed:>6} {peak:>5} {limit:>6}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("--cassette", help="serve: replay this requests.jsonl")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--capacity", type=int, default=24)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--dup", type=float, default=0.2)
+    parser.add_argument("--fixed", type=int, nargs="*", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--start", type=int, default=8, help="AIMD start limit")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        return serve(args)
+    return asyncio.run(_bench(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
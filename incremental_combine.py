@@ -0,0 +1,592 @@
+"""
+Incremental combiner for the half-hourly daily run.
+
+combine_dailyshards.py re-parses all nine detailedN.json shards on every run
+and rebuilds finalsummary.json from scratch.  This script keeps a compact
+state next to the day's data, in combine_state/:
+
+    index.json.gz                shard sha256s + exact per-movie / city /
+                                 language / format accumulators
+                                 (see daily_summary.py)
+    detailedN.sessions.jsonl.gz  one [session key, contribution] line per
+                                 show of that shard, in file order
+
+On a run, shards whose sha256 is unchanged are not even parsed.  A changed
+shard is streamed against its sessions file: both are in file order, so
+each new row is matched against the old sessions within WINDOW positions
+of it, and only the sessions that were added, removed or whose
+contribution changed are folded in or out of the aggregate.  Memory stays
+at the window plus the aggregate, whatever the shard size.  A show that
+moved further than the window is taken out and added back, which gives
+the same aggregate.  Everything is integer arithmetic, so the output is
+byte-identical to a full rebuild.
+
+The combine job in dailymain.yml runs it in place of combine_dailyshards.py
+and commits combine_state/ with the day's data.  --detailed-out also
+writes finaldetailed.json, as combine_dailyshards.py does; an incremental
+run only rewrites it when a shard changed.
+
+Usage:
+    python incremental_combine.py                  # today (IST), incremental
+    python incremental_combine.py --date 20260212 --full
+    python incremental_combine.py --verify         # full vs incremental vs the
+                                                   # committed finalsummary.json
+    python incremental_combine.py --detailed-out daily/data/20260212/finaldetailed.json
+    python incremental_combine.py --full --detailed-out combined.jsonl
+    python incremental_combine.py --memcheck --date 20260212
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict, defaultdict, deque
+from pathlib import Path
+
+import daily_summary as ds
+from json_stream import (ArrayWriter, JsonLinesWriter, iter_rows,
+                         peak_rss_mb)
+
+STATE_DIR = "combine_state"
+STATE_VERSION = 4
+# how far (in rows) a show may move between runs and still be matched
+WINDOW = 4096
+
+
+def _read_gz_json(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_gz_json(path, obj):
+    tmp = path.with_name(path.name + ".tmp")
+    # mtime=0 keeps the gzip header stable, so an unchanged state is an
+    # unchanged blob for git.
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0,
+                           compresslevel=6) as gz:
+            with io.TextIOWrapper(gz, encoding="utf-8") as text:
+                json.dump(obj, text, ensure_ascii=False, separators=(",", ":"))
+    tmp.replace(path)
+
+
+def empty_state():
+    return {"version": STATE_VERSION, "shards": {}, "aggregate": {}}
+
+
+def load_state(folder):
+    """
+    index.json.gz holds the shard hashes and the aggregate; the per-session
+    maps live in one file per shard and are only read when that shard changed.
+    """
+    path = Path(folder) / STATE_DIR / "index.json.gz"
+    if not path.exists():
+        return empty_state()
+    try:
+        state = _read_gz_json(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠ Ignoring unreadable {path}: {e}")
+        return empty_state()
+    if state.get("version") != STATE_VERSION:
+        return empty_state()
+    # without a shard's sessions its old contribution cannot be taken out
+    for name in state["shards"]:
+        if not _sessions_path(folder, name).exists():
+            return empty_state()
+    return state
+
+
+def _sessions_path(folder, shard_name):
+    return Path(folder) / STATE_DIR / f"{Path(shard_name).stem}.sessions.jsonl.gz"
+
+
+def iter_sessions(folder, shard_name):
+    """(session key, contribution) of a shard's last combined run, in file order."""
+    with gzip.open(_sessions_path(folder, shard_name), "rt", encoding="utf-8") as f:
+        for line in f:
+            key, c = json.loads(line)
+            yield key, c
+
+
+class SessionWriter:
+    """
+    Writes a shard's new sessions file next to the old one; save_state()
+    moves it into place once the whole run has gone through.
+    """
+
+    def __init__(self, folder, shard_name):
+        self.path = _sessions_path(folder, shard_name)
+        self.path.parent.mkdir(exist_ok=True)
+        self.tmp = self.path.with_name(self.path.name + ".tmp")
+        self._raw = open(self.tmp, "wb")
+        # mtime=0 keeps the gzip header stable, so an unchanged state is an
+        # unchanged blob for git
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb", mtime=0,
+                                 compresslevel=6)
+        self._text = io.TextIOWrapper(self._gz, encoding="utf-8")
+
+    def write(self, key, c):
+        self._text.write(json.dumps([key, c], ensure_ascii=False,
+                                    separators=(",", ":")))
+        self._text.write("\n")
+
+    def close(self):
+        self._text.close()
+        self._raw.close()
+
+    def commit(self):
+        self.tmp.replace(self.path)
+
+
+def save_state(folder, state, changed_sessions):
+    """``changed_sessions``: {shard name: closed SessionWriter, or None if removed}."""
+    root = Path(folder) / STATE_DIR
+    root.mkdir(exist_ok=True)
+    for name, writer in changed_sessions.items():
+        if writer is None:
+            _sessions_path(folder, name).unlink(missing_ok=True)
+        else:
+            writer.commit()
+    _write_gz_json(root / "index.json.gz", state)
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Combine
+# ---------------------------------------------------------------------------
+
+def diff_shard(agg, old, rows, shard, writer, stats):
+    """
+    Fold one changed shard into ``agg``: ``old`` yields the shard's
+    (key, contribution) pairs from the last run, ``rows`` its rows now,
+    both in file order.  Old sessions are read at most WINDOW positions
+    ahead of the current row and count as removed once they fall WINDOW
+    behind it.  Repeated keys match in order.  Every new session goes to
+    ``writer``.
+    """
+    pending = OrderedDict()         # old position -> (key, contribution)
+    by_key = defaultdict(deque)     # key -> old positions, ascending
+    old = enumerate(old)
+    read = 0
+    exhausted = False
+
+    def drop(pos):
+        key, prev = pending.pop(pos)
+        positions = by_key[key]
+        positions.popleft()         # matches and evictions always take the oldest
+        if not positions:
+            del by_key[key]
+        return prev
+
+    agg.drop_places(shard)
+    for i, row in enumerate(rows):
+        while not exhausted and read <= i + WINDOW:
+            item = next(old, None)
+            if item is None:
+                exhausted = True
+                break
+            pos, (key, prev) = item
+            pending[pos] = (key, prev)
+            by_key[key].append(pos)
+            read += 1
+        while pending and next(iter(pending)) < i - WINDOW:
+            agg.remove(drop(next(iter(pending))))
+            stats["removed"] += 1
+
+        key = ds.session_key(row)
+        # lists, not tuples, so the value equals the one read back from disk
+        c = list(ds.contribution(row, shard, i))
+        positions = by_key.get(key)
+        if positions is None:
+            agg.add(c)
+            stats["added"] += 1
+        else:
+            prev = drop(positions[0])
+            if prev[:10] != c[:10]:
+                # (the last two fields only place the show)
+                agg.remove(prev)
+                agg.add(c)
+                stats["changed"] += 1
+            else:
+                agg.place(c)
+        writer.write(key, c)
+
+    for _, prev in pending.values():
+        agg.remove(prev)
+        stats["removed"] += 1
+    for _, (_, prev) in old:
+        agg.remove(prev)
+        stats["removed"] += 1
+
+
+class DetailedWriter:
+    """
+    The combined rows, streamed to ``path``: JSON Lines for a .jsonl path,
+    otherwise the finaldetailed.json layout {"last_updated": .., "data": [..]}
+    in the shard scripts' formatting.  The file is replaced on a clean exit.
+    """
+
+    def __init__(self, path, last_updated):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + ".tmp")
+        self._f = open(self.tmp, "w", encoding="utf-8")
+        if self.path.suffix == ".jsonl":
+            self._rows = JsonLinesWriter(self._f)
+            self._tail = ""
+        else:
+            self._f.write('{\n  "last_updated": '
+                          + json.dumps(last_updated, ensure_ascii=False)
+                          + ',\n  "data": ')
+            self._rows = ArrayWriter(self._f, level=1)
+            self._tail = "\n}"
+
+    def write(self, row):
+        self._rows.write(row)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self._rows.close()
+            self._f.write(self._tail)
+        self._f.close()
+        if exc_type is None:
+            self.tmp.replace(self.path)
+        else:
+            self.tmp.unlink(missing_ok=True)
+
+
+def combine_incremental(folder, last_updated=None, shard_paths=None,
+                        detailed_out=None):
+    """
+    Update ``folder``/finalsummary.json from the shards that changed, and
+    ``detailed_out`` (see DetailedWriter) when one did or it is missing.
+    """
+    folder = Path(folder)
+    last_updated = last_updated or ds.now_ist_label()
+    if shard_paths is None:
+        shard_paths = ds.shard_paths(folder)
+    state = load_state(folder)
+    agg = ds.Aggregate.from_state(state["aggregate"])
+    stats = {"parsed": 0, "skipped": 0, "added": 0, "changed": 0,
+             "removed": 0}
+
+    present = {p.name: p for p in shard_paths}
+    changed_sessions = {}
+
+    # shards that disappeared since the last run
+    for name in list(state["shards"]):
+        if name not in present:
+            del state["shards"][name]
+            agg.drop_places(ds.shard_number(name))
+            for _, c in iter_sessions(folder, name):
+                agg.remove(c)
+                stats["removed"] += 1
+            changed_sessions[name] = None
+
+    for name, path in present.items():
+        digest = file_sha256(path)
+        old = state["shards"].get(name)
+        if old and old["sha256"] == digest:
+            stats["skipped"] += 1
+            continue
+
+        stats["parsed"] += 1
+        writer = SessionWriter(folder, name)
+        try:
+            diff_shard(agg, iter_sessions(folder, name) if old else (),
+                       iter_rows(path), ds.shard_number(path), writer, stats)
+        finally:
+            writer.close()
+
+        state["shards"][name] = {"sha256": digest}
+        changed_sessions[name] = writer
+
+    state["aggregate"] = agg.to_state()
+    summary = agg.summary(last_updated)
+    ds.write_json(folder / "finalsummary.json", summary)
+    save_state(folder, state, changed_sessions)
+
+    if detailed_out is not None and (changed_sessions or not Path(detailed_out).exists()):
+        with DetailedWriter(detailed_out, last_updated) as writer:
+            for p in shard_paths:
+                for row in iter_rows(p):
+                    writer.write(row)
+    return summary, stats
+
+
+def combine_full(folder, last_updated=None, shard_paths=None,
+                 detailed_out=None):
+    """
+    Streamed rebuild.  With ``detailed_out`` the combined rows are written
+    as they are read (see DetailedWriter).
+    """
+    folder = Path(folder)
+    if shard_paths is None:
+        shard_paths = ds.shard_paths(folder)
+    last_updated = last_updated or ds.now_ist_label()
+    if detailed_out is None:
+        summary = ds.build_summary(shard_paths, last_updated)
+    else:
+        with DetailedWriter(detailed_out, last_updated) as writer:
+            summary = ds.build_summary(shard_paths, last_updated, writer)
+    ds.write_json(folder / "finalsummary.json", summary)
+    return summary
+
+
+def memcheck(date, data_dir=ds.DATA_DIR, scales=(1, 5, 20)):
+    """
+    Peak RSS over ``scales``-times copies of a day's shards for
+
+        full         streamed --full rebuild
+        incremental  first run with no state (every shard's sessions file
+                     is written as its rows stream past)
+        one changed  next run after the largest shard was rewritten
+        json.load    plain json.load of the same files
+
+    Each run is a fresh interpreter so the peaks do not mix.
+    """
+    source = ds.shard_paths(ds.day_dir(date, data_dir))
+    if not source:
+        print(f"❌ No shard files for {date}")
+        return False
+    load_all = ("import json, sys\n"
+                "from json_stream import peak_rss_mb\n"
+                "rows = [json.load(open(p, encoding='utf-8')) for p in sys.argv[1:]]\n"
+                "print(f'peak RSS {peak_rss_mb():.1f} MB')")
+    here = str(Path(__file__).resolve().parent)
+
+    def combine(folder, *extra):
+        return _rss(subprocess.run(
+            [sys.executable, __file__, "--date", date,
+             "--data-dir", str(folder.parent), *extra],
+            capture_output=True, text=True, cwd=here, check=True).stdout)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            folder = Path(tmp) / str(scale) / date
+            folder.mkdir(parents=True)
+            size = 0
+            for p in source:
+                with open(folder / p.name, "w", encoding="utf-8") as f:
+                    with ArrayWriter(f) as writer:
+                        for _ in range(scale):
+                            for row in iter_rows(p):
+                                writer.write(row)
+                size += (folder / p.name).stat().st_size
+            largest = max(source, key=lambda p: (folder / p.name).stat().st_size)
+
+            full = combine(folder, "--full", "--detailed-out",
+                           str(folder / "finaldetailed.jsonl"))
+            cold = combine(folder)
+            write_rows(folder / largest.name,
+                       earlier_snapshot(iter_rows(folder / largest.name)))
+            warm = combine(folder)
+            loaded = _rss(subprocess.run(
+                [sys.executable, "-c", load_all,
+                 *[str(folder / p.name) for p in source]],
+                capture_output=True, text=True, cwd=here, check=True).stdout)
+            print(f"x{scale:<3} shards {size / 1e6:7.1f} MB | full {full} | "
+                  f"incremental {cold} | one changed {warm} | json.load {loaded}")
+            shutil.rmtree(folder.parent)
+    return True
+
+
+def _rss(output):
+    for line in output.splitlines():
+        if "peak RSS" in line:
+            return line[line.index("peak RSS") + len("peak RSS "):]
+    return "?"
+
+
+# ---------------------------------------------------------------------------
+# Verification
+# ---------------------------------------------------------------------------
+
+def source_paths(folder):
+    """Shard files of a day; older days only kept finaldetailed.json."""
+    paths = ds.shard_paths(folder)
+    if paths:
+        return paths
+    final = Path(folder) / "finaldetailed.json"
+    if final.exists() and ds.load_rows(final):
+        return [final]
+    return []
+
+
+def earlier_snapshot(rows):
+    """
+    A plausible previous run of the same shard: some shows not yet listed,
+    some with fewer tickets sold.
+    """
+    for i, row in enumerate(rows):
+        if i % 7 == 3:
+            continue
+        if i % 5 == 0 and row.get("sold"):
+            row = dict(row)
+            row["sold"] -= 1
+            row["available"] = row.get("available", 0) + 1
+        yield row
+
+
+def write_rows(path, rows):
+    """ds.write_json for a row iterator; it may be reading ``path`` itself."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        with ArrayWriter(f) as writer:
+            for row in rows:
+                writer.write(row)
+    tmp.replace(path)
+
+
+def verify_day(folder, label="verify"):
+    paths = source_paths(folder)
+    if not paths:
+        return None
+
+    full = ds.dump_bytes(ds.build_summary(paths, label))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        copies = [tmp / p.name for p in paths]
+
+        # run 1: earlier snapshot of every shard, state starts empty
+        for src, dst in zip(paths, copies):
+            write_rows(dst, earlier_snapshot(iter_rows(src)))
+        combine_incremental(tmp, label, copies)
+
+        # run 2: the real shards, folded in as deltas
+        for src, dst in zip(paths, copies):
+            shutil.copyfile(src, dst)
+        combine_incremental(tmp, label, copies)
+        second = (tmp / "finalsummary.json").read_bytes()
+
+        # run 3: nothing changed, every shard skipped
+        _, stats = combine_incremental(tmp, label, copies)
+        third = (tmp / "finalsummary.json").read_bytes()
+
+    return {
+        "shards": len(paths),
+        "identical": full == second == third,
+        "skipped_on_rerun": stats["skipped"] == len(paths),
+        "committed": committed_diff(folder, paths),
+    }
+
+
+def committed_diff(folder, paths):
+    """
+    Compare with the finalsummary.json combine_dailyshards.py committed for
+    the day, last_updated aside.  Returns None when there is none, else
+    (movies whose totals differ, movies that only differ in the detail
+    lists).  Different totals mean the shards were scraped again after that
+    combine ran; equal totals with other details mean we combine differently.
+    """
+    path = Path(folder) / "finalsummary.json"
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        committed = json.load(f)
+    committed["last_updated"] = "verify"
+    ours = ds.build_summary(paths, "verify")
+    if ds.dump_bytes(ours) == ds.dump_bytes(committed):
+        return [], []
+
+    ours, theirs = ours["movies"], committed.get("movies", {})
+    totals, details = [], []
+    for name in sorted(set(ours) | set(theirs)):
+        a, b = ours.get(name), theirs.get(name)
+        if a is None or b is None:
+            totals.append(name)
+        elif ds.dump_bytes(a) != ds.dump_bytes(b):
+            heads = [{k: v for k, v in m.items() if not k.endswith("_details")}
+                     for m in (a, b)]
+            (totals if heads[0] != heads[1] else details).append(name)
+    return totals, details
+
+
+def verify_all(data_dir=ds.DATA_DIR):
+    ok = True
+    for folder in sorted(p for p in Path(data_dir).iterdir() if p.is_dir()):
+        result = verify_day(folder)
+        if result is None:
+            print(f"{folder.name}: no shard files, skipped")
+            continue
+        good = result["identical"] and result["skipped_on_rerun"]
+        diff = result["committed"]
+        if diff is None:
+            committed = "no committed summary"
+        elif diff == ([], []):
+            committed = "committed summary identical"
+        else:
+            totals, details = diff
+            committed = (f"committed summary: {len(details)} movie(s) with other "
+                         f"details, {len(totals)} with other totals")
+            if totals:
+                committed += " (shards newer than the summary)"
+            if details:
+                committed += f", e.g. {details[0]!r}"
+            good &= not details
+        ok &= good
+        print(f"{folder.name}: {'OK ' if good else 'DIFF'} "
+              f"({result['shards']} shard file(s)) | {committed}")
+    return ok
+
+
+# ---------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--date", default=None, help="YYYYMMDD (default: today IST)")
+    parser.add_argument("--data-dir", default=str(ds.DATA_DIR))
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the saved state and rebuild everything")
+    parser.add_argument("--verify", action="store_true",
+                        help="compare full and incremental output for every day")
+    parser.add_argument("--detailed-out", default=None,
+                        help="also write the combined rows here (.jsonl for "
+                             "JSON Lines, else the finaldetailed.json layout)")
+    parser.add_argument("--memcheck", action="store_true",
+                        help="peak RSS of full and incremental combines at "
+                             "1x/5x/20x shard size")
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        return 0 if verify_all(args.data_dir) else 1
+    if args.memcheck:
+        return 0 if memcheck(args.date or ds.today_ist(), args.data_dir) else 1
+
+    folder = ds.day_dir(args.date or ds.today_ist(), args.data_dir)
+    if not ds.shard_paths(folder):
+        print(f"❌ No shard files in {folder}")
+        return 1
+
+    if args.full:
+        summary = combine_full(folder, detailed_out=args.detailed_out)
+        shutil.rmtree(folder / STATE_DIR, ignore_errors=True)
+        print(f"✅ Full rebuild: {len(summary['movies'])} movies")
+    else:
+        summary, stats = combine_incremental(folder, detailed_out=args.detailed_out)
+        print(f"✅ Incremental: {len(summary['movies'])} movies | "
+              f"shards parsed {stats['parsed']}, skipped {stats['skipped']} | "
+              f"sessions +{stats['added']} ~{stats['changed']} "
+              f"-{stats['removed']}")
+    print(f"peak RSS {peak_rss_mb():.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
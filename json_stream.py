@@ -0,0 +1,205 @@
+"""
+Streaming JSON helpers for the shard files.
+
+detailedN.json is one big top-level array; json.load materialises every
+show dict of it at once.  iter_rows() walks the array item by item with
+the C decoder (JSONDecoder.raw_decode) over a bounded read buffer, so
+memory stays at one chunk plus one item whatever the file size.
+
+ArrayWriter writes an array incrementally with exactly the bytes
+json.dump(items, indent=2, ensure_ascii=False) would produce;
+JsonLinesWriter writes one compact item per line.
+"""
+
+import json
+import resource
+import sys
+
+CHUNK = 1 << 16
+MAX_ITEM = 1 << 20      # characters; a show row is about 1 KB
+
+_WS = " \t\n\r"
+
+
+class _Reader:
+    """Text buffer over a file that refills on demand."""
+
+    def __init__(self, fp, chunk_size, max_item=MAX_ITEM):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.max_item = max_item
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        data = self.fp.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        if self.pos > self.chunk_size:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += data
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (not consumed), '' at EOF."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        got = self.peek()
+        if got != char:
+            raise ValueError(f"expected {char!r}, got {got!r}")
+        self.pos += 1
+
+    def value(self, decoder):
+        self.peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # Only an item cut off by the end of the buffer is worth
+                # another chunk, and only up to one item's size: malformed
+                # input must not pull the rest of the file into memory.
+                if not self._truncated(e) or len(self.buf) - self.pos >= self.max_item:
+                    raise
+                if not self.fill():
+                    raise
+                continue
+            # a bare number could continue in the next chunk
+            if end == len(self.buf) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return obj
+
+    def _truncated(self, e):
+        # an unterminated string reports where it starts; anything else
+        # reports where the text stopped making sense
+        return (e.msg.startswith("Unterminated string")
+                or e.pos >= len(self.buf) - 8)
+
+
+def _iter_array(reader, decoder):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value(decoder)
+        nxt = reader.peek()
+        reader.pos += 1
+        if nxt == "]":
+            return
+        if nxt != ",":
+            raise ValueError(f"expected ',' or ']', got {nxt!r}")
+
+
+def iter_array(fp, key=None, chunk_size=CHUNK, max_item=MAX_ITEM):
+    """
+    Yield the items of the top-level array in ``fp``.  If the top level is
+    an object, stream the array stored under ``key`` instead (the
+    finaldetailed.json layout, {"last_updated": .., "data": [..]}).
+    An item longer than ``max_item`` characters is an error.
+    """
+    decoder = json.JSONDecoder()
+    reader = _Reader(fp, chunk_size, max_item)
+    first = reader.peek()
+    if first == "[":
+        yield from _iter_array(reader, decoder)
+        return
+    if first != "{" or key is None:
+        raise ValueError(f"expected a JSON array, got {first!r}")
+
+    reader.expect("{")
+    while reader.peek() != "}":
+        name = reader.value(decoder)
+        reader.expect(":")
+        if name == key:
+            yield from _iter_array(reader, decoder)
+            return
+        reader.value(decoder)
+        if reader.peek() == ",":
+            reader.pos += 1
+
+
+def iter_rows(path, chunk_size=CHUNK):
+    """Show rows of a detailedN.json or finaldetailed.json, one at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_array(f, key="data", chunk_size=chunk_size)
+
+
+class ArrayWriter:
+    """
+    Incremental json.dump(list, indent=2, ensure_ascii=False).
+    ``level`` nests the array that many indents deep (for wrapped arrays).
+    """
+
+    def __init__(self, fp, indent=2, level=0):
+        self.fp = fp
+        self.indent = indent
+        self.pad = "\n" + " " * (indent * (level + 1))
+        self.close_pad = "\n" + " " * (indent * level)
+        self.count = 0
+
+    def write(self, item):
+        text = json.dumps(item, indent=self.indent, ensure_ascii=False)
+        self.fp.write(("[" if self.count == 0 else ",") + self.pad
+                      + text.replace("\n", self.pad))
+        self.count += 1
+
+    def close(self):
+        self.fp.write("[]" if self.count == 0 else self.close_pad + "]")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+
+
+class JsonLinesWriter:
+    def __init__(self, fp):
+        self.fp = fp
+        self.count = 0
+
+    def write(self, item):
+        self.fp.write(json.dumps(item, ensure_ascii=False))
+        self.fp.write("\n")
+        self.count += 1
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB.  VmHWM where
+    /proc has it: ru_maxrss is carried over from the parent at fork, so a
+    freshly started child would report its parent's peak.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
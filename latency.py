@@ -0,0 +1,28 @@
+"""
+Latency statistics shared by fetch_pool.py and run_metrics.py.
+
+Standard library only, so the fetch layer can use it without pulling in
+the summary code (pytz) or the metrics wrapper.
+"""
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def busy_time(intervals):
+    """Total length of the union of (start, end) intervals."""
+    total, end = 0.0, None
+    for s, e in sorted(intervals):
+        if end is None or s > end:
+            total += e - s
+            end = e
+        elif e > end:
+            total += e - end
+            end = e
+    return total
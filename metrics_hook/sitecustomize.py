@@ -0,0 +1,236 @@
+"""
+Stage timers for scripts started by run_metrics.py.
+
+run_metrics puts this directory first on the child's PYTHONPATH, so Python
+imports this module at startup, before the (obfuscated) script runs.  It
+times, without touching the script:
+
+    network  aiohttp requests (a TraceConfig added to every ClientSession)
+             and requests/cloudscraper Session.send: count, errors, bytes,
+             time to headers per request, and each request's span until
+             its last body chunk (for busy time)
+    parse    json.loads / json.load: calls, bytes, time
+    write    json.dump / json.dumps: calls, characters, time, and the
+             length of every top-level list dumped (= records)
+
+aiohttp and requests are patched when the script imports them, so a run
+that never imports them does not pay for it.  At exit the raw figures go
+to the file named by RUN_STAGES; run_metrics folds them into the run's
+metrics.  Standard library only, and every hook swallows its own errors:
+a failing timer must never change what the script does.
+
+Any other sitecustomize on the path is still imported after this one.
+"""
+
+import atexit
+import importlib.abc
+import importlib.machinery
+import json
+import os
+import sys
+import threading
+import time
+
+_lock = threading.Lock()
+_stages = {}
+# _dump() writes with the original, so the figures are not timed themselves
+_json_dump = json.dump
+
+
+def _stage(name):
+    st = _stages.get(name)
+    if st is None:
+        st = _stages[name] = {"wall": 0.0, "calls": 0, "records": 0, "bytes": 0,
+                              "errors": 0, "latencies": [], "intervals": []}
+    return st
+
+
+def _add(name, elapsed, nbytes=0, records=0):
+    with _lock:
+        st = _stage(name)
+        st["calls"] += 1
+        st["wall"] += elapsed
+        st["bytes"] += nbytes
+        st["records"] += records
+
+
+def _request(span, latency, ok):
+    """``span`` is a [start, end] list the body callbacks may still extend."""
+    with _lock:
+        st = _stage("network")
+        st["calls"] += 1
+        st["latencies"].append(latency)
+        st["intervals"].append(span)
+        if not ok:
+            st["errors"] += 1
+
+
+def _received(nbytes):
+    with _lock:
+        _stage("network")["bytes"] += nbytes
+
+
+def _dump():
+    path = os.environ.get("RUN_STAGES")
+    if not path or not _stages:
+        return
+    try:
+        with _lock, open(path, "w", encoding="utf-8") as f:
+            _json_dump(_stages, f)
+    except Exception:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# json
+# ---------------------------------------------------------------------------
+
+class _CountingWriter:
+    def __init__(self, fp):
+        self.fp = fp
+        self.chars = 0
+
+    def write(self, s):
+        self.chars += len(s)
+        return self.fp.write(s)
+
+
+def _size(s):
+    if isinstance(s, str):
+        return len(s.encode("utf-8"))
+    return len(s) if isinstance(s, (bytes, bytearray)) else 0
+
+
+def _hook_json():
+    loads, dump, dumps = json.loads, json.dump, json.dumps
+
+    def timed_loads(s, *a, **kw):
+        # json.load() goes through json.loads(), so this covers both
+        t0 = time.perf_counter()
+        try:
+            return loads(s, *a, **kw)
+        finally:
+            _add("parse", time.perf_counter() - t0, _size(s))
+
+    def timed_dump(obj, fp, *a, **kw):
+        w = _CountingWriter(fp)
+        t0 = time.perf_counter()
+        try:
+            dump(obj, w, *a, **kw)
+        finally:
+            _add("write", time.perf_counter() - t0, w.chars,
+                 len(obj) if isinstance(obj, list) else 0)
+
+    def timed_dumps(obj, *a, **kw):
+        t0 = time.perf_counter()
+        s = dumps(obj, *a, **kw)
+        _add("write", time.perf_counter() - t0, len(s),
+             len(obj) if isinstance(obj, list) else 0)
+        return s
+
+    json.loads, json.dump, json.dumps = timed_loads, timed_dump, timed_dumps
+
+
+# ---------------------------------------------------------------------------
+# HTTP clients, patched on import
+# ---------------------------------------------------------------------------
+
+def _hook_aiohttp(aiohttp):
+    async def on_start(session, ctx, params):
+        ctx.span = [time.perf_counter()] * 2
+
+    async def on_end(session, ctx, params):
+        ctx.span[1] = time.perf_counter()
+        _request(ctx.span, ctx.span[1] - ctx.span[0], params.response.status < 400)
+
+    async def on_chunk(session, ctx, params):
+        # body chunks arrive after on_request_end, which fires on headers
+        span = getattr(ctx, "span", None)
+        if span is not None:
+            span[1] = time.perf_counter()
+        _received(len(params.chunk))
+
+    async def on_error(session, ctx, params):
+        ctx.span[1] = time.perf_counter()
+        _request(ctx.span, ctx.span[1] - ctx.span[0], False)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_start)
+    trace.on_request_end.append(on_end)
+    trace.on_response_chunk_received.append(on_chunk)
+    trace.on_request_exception.append(on_error)
+
+    init = aiohttp.ClientSession.__init__
+
+    def traced_init(self, *a, **kw):
+        kw["trace_configs"] = list(kw.get("trace_configs") or []) + [trace]
+        init(self, *a, **kw)
+
+    aiohttp.ClientSession.__init__ = traced_init
+
+
+def _hook_requests(requests):
+    send = requests.Session.send
+
+    def timed_send(self, request, **kw):
+        t0 = time.perf_counter()
+        try:
+            resp = send(self, request, **kw)
+        except Exception:
+            end = time.perf_counter()
+            _request([t0, end], end - t0, False)
+            raise
+        end = time.perf_counter()
+        _request([t0, end], end - t0, resp.status_code < 400)
+        if not kw.get("stream"):
+            _received(len(resp.content))
+        return resp
+
+    requests.Session.send = timed_send
+
+
+class _PatchOnImport(importlib.abc.MetaPathFinder):
+    hooks = {"aiohttp": _hook_aiohttp, "requests": _hook_requests}
+
+    def find_spec(self, name, path, target=None):
+        hook = self.hooks.get(name)
+        if hook is None:
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(name, path)
+        if spec is None or not hasattr(spec.loader, "exec_module"):
+            return None
+        exec_module = spec.loader.exec_module
+
+        def exec_and_patch(module):
+            exec_module(module)
+            try:
+                hook(module)
+            except Exception:
+                pass
+
+        spec.loader.exec_module = exec_and_patch
+        return spec
+
+
+def _chain():
+    """Import the sitecustomize this module shadows, if there is one."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    saved, me = sys.path[:], sys.modules.pop(__name__)
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or ".") != here]
+    try:
+        import sitecustomize  # noqa: F401
+    except ImportError:
+        pass
+    finally:
+        sys.path[:] = saved
+        sys.modules[__name__] = me
+
+
+if os.environ.get("RUN_STAGES"):
+    try:
+        _hook_json()
+        sys.meta_path.insert(0, _PatchOnImport())
+        atexit.register(_dump)
+    except Exception:
+        pass
+_chain()
@@ -0,0 +1,522 @@
+"""
+Benchmark of the data-processing steps over the checked-in daily/data days.
+
+Steps, each timed best-of-N per fixture:
+
+    venues_load    venues1..8.json + districtvenues.json -> lookup indexes
+    venue_lookup   every show row of the fixture resolved to its venue
+    parse          json.load of every detailedN.json
+    movie_summary  movie_summaryN.json per shard (built + serialised;
+                   shard 9 with its City/Language/Format details)
+    aggregate      all shards -> finalsummary.json with daily_summary
+                   (built + serialised)
+    archive        show_archive.convert_day on a scratch copy; skipped
+                   without zstandard
+    combine_script python combine_dailyshards.py, the production merge
+    cleanup_script python cleanup_shard_files.py, the production cleanup
+
+The two *_script steps run the real (obfuscated) scripts as a child
+process in a scratch tree holding the fixture as today's folder, so they
+time what the workflows run; they are skipped when the pyarmor runtime
+does not load (it needs the Python the workflows use, 3.12), and a script
+that exits non-zero is reported and left out.
+
+Fixtures are the days with shard files, plus synthetic 5x and 20x copies
+of the largest day (every show repeated with the venue and session_id
+made distinct, so distinct-venue counts grow too).  When a baseline
+exists the fixtures default to its days, so the comparison keeps the same
+inputs; a day whose shard files were cleaned up is exported from its
+show archive into the scratch folder.
+
+Times are also stored relative to a fixed calibration workload that runs
+between the repetitions of every step, and comparisons use those, so a
+baseline from another box still lines up and load from another process
+during the run slows the step and its calibration alike.  The report
+(bench/latest.json) can be saved as the baseline; later runs are compared
+key by key and the exit code is 1 when a step got slower by more than
+--threshold (and by more than --min-delta seconds, so noise on millisecond
+steps does not fail a run).  Only a baseline recorded on the same Python
+version gates: against any other the comparison is printed and the exit
+code stays 0, so record it where the check runs (the bench workflow's
+save_baseline dispatch).  Steps the baseline lacks are listed as ungated.
+
+Usage:
+    python pipeline_bench.py [--scales 1 5 20] [--repeat 5] [--days 20260212 ...]
+    python pipeline_bench.py --save-baseline
+    python pipeline_bench.py --threshold 0.25
+"""
+
+import argparse
+import gc
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import daily_summary as ds
+from json_stream import ArrayWriter, iter_rows, peak_rss_mb
+from plan_shards import VenueIndex, load_venue_files
+
+BENCH_DIR = Path("bench")
+STEPS = ["venues_load", "venue_lookup", "parse", "movie_summary", "aggregate", "archive",
+         "combine_script", "cleanup_script"]
+RUNTIME = "pyarmor_runtime_000000"
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+def fixture_days(data_dir=ds.DATA_DIR, days=None, scratch=None):
+    """
+    Day folders that still have their detailedN.json shards.  Named
+    ``days`` without them are exported from the show archive under
+    ``scratch`` (when there is one and zstandard is installed).
+    """
+    if not days:
+        folders = sorted(p for p in Path(data_dir).iterdir() if p.is_dir())
+        return [p for p in folders if ds.shard_paths(p)]
+    found = []
+    for day in sorted(days):
+        folder = ds.day_dir(day, data_dir)
+        if not ds.shard_paths(folder) and scratch is not None:
+            folder = restore_day(day, scratch)
+        if folder is not None and ds.shard_paths(folder):
+            found.append(folder)
+        else:
+            print(f"⚠ {day}: no shard files or archive, not benchmarked")
+    return found
+
+
+def restore_day(day, scratch):
+    if not _has_zstd():
+        return None
+    import show_archive
+    if not show_archive.archive_path(day).exists():
+        return None
+    folder = scratch / "fixtures" / day
+    show_archive.export_day(day, folder)
+    return folder
+
+
+def scaled_rows(rows, scale):
+    """The rows, then ``scale - 1`` copies at distinct venues/sessions."""
+    yield from rows
+    for k in range(1, scale):
+        for row in rows:
+            row = dict(row)
+            row["venue"] = f"{row.get('venue')} #{k}"
+            if row.get("session_id"):
+                row["session_id"] = f"{row['session_id']}-{k}"
+            yield row
+
+
+def write_scaled(folder, out, scale):
+    out.mkdir(parents=True)
+    for p in ds.shard_paths(folder):
+        rows = list(iter_rows(p))
+        with open(out / p.name, "w", encoding="utf-8") as f:
+            with ArrayWriter(f) as writer:
+                for row in scaled_rows(rows, scale):
+                    writer.write(row)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Steps: each returns (rows handled, bytes produced or read)
+# ---------------------------------------------------------------------------
+
+class DistrictIndex:
+    """districtvenues.json by cinema name, then address."""
+
+    def __init__(self, venues):
+        self.by_name = {}
+        self.by_address = {}
+        for v in venues:
+            self.by_name.setdefault(v.get("cinemaName"), v)
+            self.by_address.setdefault(v.get("address"), v)
+
+    def lookup(self, row):
+        return self.by_name.get(row.get("venue")) or self.by_address.get(row.get("address"))
+
+
+def load_indexes(root="."):
+    bms = VenueIndex(load_venue_files(root))
+    with open(Path(root) / "districtvenues.json", "r", encoding="utf-8") as f:
+        district = DistrictIndex(json.load(f))
+    return bms, district
+
+
+def step_venues_load(ctx):
+    bms, district = load_indexes()
+    return len(bms.shard_of) + len(district.by_name), 0
+
+
+def step_venue_lookup(ctx):
+    bms, district = ctx["indexes"]
+    hits = rows = 0
+    for shard, shard_rows in ctx["rows"].items():
+        for row in shard_rows:
+            found = (district.lookup(row) if shard == ds.SHARD_COUNT
+                     else bms.lookup(row))
+            hits += bool(found)
+            rows += 1
+    return rows, 0
+
+
+def step_parse(ctx):
+    rows = size = 0
+    for p in ctx["paths"]:
+        with open(p, "r", encoding="utf-8") as f:
+            rows += len(json.load(f))
+        size += p.stat().st_size
+    return rows, size
+
+
+def step_movie_summary(ctx):
+    rows = size = 0
+    for shard, shard_rows in ctx["rows"].items():
+        # the district shard's summary also carries the detail lists
+        summary = ds.movie_summary(shard_rows, details=shard == ds.SHARD_COUNT)
+        size += len(ds.dump_bytes(summary))
+        rows += len(shard_rows)
+    return rows, size
+
+
+def step_aggregate(ctx):
+    agg = ds.Aggregate()
+    rows = 0
+    for shard, shard_rows in ctx["rows"].items():
+        agg.add_rows(shard_rows, shard)
+        rows += len(shard_rows)
+    return rows, len(ds.dump_bytes(agg.summary("bench")))
+
+
+def step_archive(ctx):
+    import show_archive
+    scratch = ctx["scratch"] / "archive"
+    day = scratch / ctx["folder"].name
+    shutil.rmtree(scratch, ignore_errors=True)
+    shutil.copytree(ctx["folder"], day)
+    t0 = time.perf_counter()
+    target = show_archive.convert_day(day, archive_dir=scratch / "archive")
+    ctx["timed_s"] = time.perf_counter() - t0     # leave the copy out
+    return sum(len(r) for r in ctx["rows"].values()), target.stat().st_size
+
+
+class ScriptFailed(Exception):
+    pass
+
+
+def run_script(ctx, script):
+    """
+    ``script`` as a child process in a scratch tree (the script, the
+    pyarmor runtime and the fixture as daily/data/<today>); returns
+    (rows, bytes of the files it wrote) and times only the child.
+    """
+    scratch = ctx["scratch"] / "script"
+    shutil.rmtree(scratch, ignore_errors=True)
+    day = ds.day_dir(ds.today_ist(), scratch / ds.DATA_DIR)
+    shutil.copytree(ctx["folder"], day)
+    shutil.copytree(RUNTIME, scratch / RUNTIME)
+    shutil.copy2(script, scratch / script)
+    start = time.time()
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, script], cwd=scratch,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    ctx["timed_s"] = time.perf_counter() - t0
+    if proc.returncode:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["no output"]
+        raise ScriptFailed(f"{script} exited {proc.returncode}: {tail[0]}")
+    written = sum(p.stat().st_size for p in (scratch / "daily").rglob("*")
+                  if p.is_file() and p.stat().st_mtime >= start)
+    return sum(len(r) for r in ctx["rows"].values()), written
+
+
+def step_combine_script(ctx):
+    return run_script(ctx, "combine_dailyshards.py")
+
+
+def step_cleanup_script(ctx):
+    return run_script(ctx, "cleanup_shard_files.py")
+
+
+def _runtime_loads():
+    """The obfuscated scripts run only where their pyarmor runtime imports."""
+    proc = subprocess.run([sys.executable, "-c", f"import {RUNTIME}"],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return proc.returncode == 0
+
+
+def _has_zstd():
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+_PAYLOAD = [{"movie": f"m{i % 97}", "venue": f"v{i % 1009}", "sold": i % 300,
+             "gross": i * 1.5, "city": "Mumbai"} for i in range(20000)]
+
+
+def _calibration_run():
+    gc.collect()
+    t0 = time.perf_counter()
+    totals = {}
+    for row in json.loads(json.dumps(_PAYLOAD)):
+        key = (row["movie"], row["city"].title())
+        totals[key] = totals.get(key, 0) + row["sold"]
+    return time.perf_counter() - t0
+
+
+def calibrate(repeat=5):
+    """
+    Seconds for a fixed JSON + dict workload on this machine (best of
+    ``repeat``).  Steps are compared as multiples of it, so a baseline
+    taken on a faster or slower box still lines up.
+    """
+    return min(_calibration_run() for _ in range(repeat))
+
+
+def time_step(fn, ctx, repeat):
+    """
+    Best-of-``repeat`` seconds, plus the time relative to the calibration
+    workload.  The workload runs between the repetitions, so each one is
+    measured against calibrations taken right before and after it: load
+    from another process slows both and cancels out.  The median of those
+    ratios is the step's "relative".
+    """
+    best = None
+    ratios = []
+    cals = [_calibration_run()]
+    for _ in range(repeat):
+        gc.collect()
+        ctx.pop("timed_s", None)
+        t0 = time.perf_counter()
+        rows, size = fn(ctx)
+        elapsed = ctx.get("timed_s", time.perf_counter() - t0)
+        best = elapsed if best is None else min(best, elapsed)
+        cals.append(_calibration_run())
+        ratios.append(elapsed / ((cals[-2] + cals[-1]) / 2))
+    return {"seconds": round(best, 4), "rows": rows,
+            "rows_per_s": round(rows / best) if best else None, "bytes": size,
+            "relative": round(statistics.median(ratios), 3),
+            "calibration_s": round(statistics.median(cals), 4)}
+
+
+def bench_fixture(name, folder, scratch, repeat, indexes, scripts=False):
+    paths = ds.shard_paths(folder)
+    ctx = {
+        "folder": folder,
+        "paths": paths,
+        "scratch": scratch,
+        "indexes": indexes,
+        "rows": {int(p.stem[len("detailed"):]): ds.load_rows(p) for p in paths},
+    }
+    steps = {
+        "venues_load": step_venues_load,
+        "venue_lookup": step_venue_lookup,
+        "parse": step_parse,
+        "movie_summary": step_movie_summary,
+        "aggregate": step_aggregate,
+    }
+    if _has_zstd():
+        steps["archive"] = step_archive
+    if scripts:
+        steps["combine_script"] = step_combine_script
+        steps["cleanup_script"] = step_cleanup_script
+    out = {}
+    for step in STEPS:
+        if step not in steps:
+            continue
+        try:
+            out[step] = time_step(steps[step], ctx, repeat)
+        except ScriptFailed as e:
+            print(f"⚠ {name}/{step} skipped: {e}")
+    shows = sum(len(r) for r in ctx["rows"].values())
+    print(f"{name:<12} {shows:>7} shows  " + "  ".join(
+        f"{s} {r['seconds'] * 1000:,.0f}ms" for s, r in out.items()))
+    return {"shows": shows, "steps": out}
+
+
+def run(data_dir=ds.DATA_DIR, days=None, scales=(1, 5, 20), repeat=5):
+    indexes = load_indexes()
+    scripts = _runtime_loads()
+    if not scripts:
+        print(f"⚠ {RUNTIME} does not load on Python {platform.python_version()}; "
+              "combine_script and cleanup_script skipped")
+    unit = calibrate()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = Path(tmp)
+        fixtures = fixture_days(data_dir, days, scratch)
+        if not fixtures:
+            raise SystemExit("❌ No days with shard files to benchmark")
+        if 1 in scales:
+            for folder in fixtures:
+                results[folder.name] = bench_fixture(folder.name, folder, scratch,
+                                                     repeat, indexes, scripts)
+        # scale-ups of the day with the most shard bytes
+        largest = max(fixtures, key=lambda p: sum(x.stat().st_size
+                                                  for x in ds.shard_paths(p)))
+        for scale in scales:
+            if scale == 1:
+                continue
+            folder = write_scaled(largest, scratch / f"x{scale}" / largest.name, scale)
+            name = f"{largest.name}x{scale}"
+            results[name] = bench_fixture(name, folder, scratch, repeat, indexes, scripts)
+            shutil.rmtree(folder.parent)
+
+    unit = min(unit, calibrate())
+
+    return {
+        "created": datetime.now(ds.IST).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "calibration_s": round(unit, 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "fixtures": results,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Report / compare
+# ---------------------------------------------------------------------------
+
+def scaling(report):
+    """{step: {scale: time / time at 1x}} for the scaled fixtures."""
+    out = {}
+    for name, fx in report["fixtures"].items():
+        if "x" not in name:
+            continue
+        base_name, scale = name.split("x")
+        base = report["fixtures"].get(base_name)
+        if not base:
+            continue
+        for step, r in fx["steps"].items():
+            b = base["steps"].get(step)
+            if b and b["seconds"]:
+                out.setdefault(step, {})[int(scale)] = round(r["seconds"] / b["seconds"], 2)
+    return out
+
+
+def compare(report, baseline, threshold, min_delta):
+    """
+    [(key, baseline s, current s, change, regressed)] for every step in
+    both reports.  The change is measured on calibration-relative times;
+    the seconds are shown as measured.
+    """
+    rows = []
+    for name, fx in report["fixtures"].items():
+        base_fx = baseline.get("fixtures", {}).get(name)
+        if not base_fx:
+            continue
+        for step, r in fx["steps"].items():
+            b = base_fx["steps"].get(step)
+            if not b or not b.get("relative"):
+                continue
+            change = r["relative"] / b["relative"] - 1
+            delta = (r["relative"] - b["relative"]) * r["calibration_s"]
+            regressed = change > threshold and delta > min_delta
+            rows.append((f"{name}/{step}", b["seconds"], r["seconds"], change, regressed))
+    return rows
+
+
+def ungated(report, baseline):
+    """Steps this run timed that the baseline has no figure for."""
+    missing = set()
+    for name, fx in report["fixtures"].items():
+        base_steps = baseline.get("fixtures", {}).get(name, {}).get("steps", {})
+        missing.update(step for step in fx["steps"] if step not in base_steps)
+    return [step for step in STEPS if step in missing]
+
+
+def print_report(report, comparison):
+    print()
+    scales = scaling(report)
+    if scales:
+        print("scaling (time relative to 1x; linear = the scale factor)")
+        for step in STEPS:
+            if step in scales:
+                print(f"  {step:<14} " + "  ".join(f"x{k}: {v:>5}"
+                                                   for k, v in sorted(scales[step].items())))
+    if comparison:
+        print(f"\n{'metric':<32} {'baseline s':>10} {'current s':>10} {'change*':>8}")
+        for key, base, cur, change, regressed in comparison:
+            flag = "  ❌ REGRESSION" if regressed else ""
+            print(f"{key:<32} {base:>10.4f} {cur:>10.4f} {change:>+8.1%}{flag}")
+        print("* relative to the calibration workload")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data-dir", default=str(ds.DATA_DIR))
+    parser.add_argument("--days", nargs="*", help="only these YYYYMMDD fixtures")
+    parser.add_argument("--scales", type=int, nargs="*", default=[1, 5, 20])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=str(BENCH_DIR / "latest.json"))
+    parser.add_argument("--baseline", default=str(BENCH_DIR / "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown per step (0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=0.02,
+                        help="ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args(argv)
+
+    baseline_path = Path(args.baseline)
+    baseline = None
+    if baseline_path.exists() and not args.save_baseline:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if args.days is None:
+            args.days = [name for name in baseline["fixtures"] if "x" not in name]
+
+    report = run(args.data_dir, args.days, args.scales, args.repeat)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    ds.write_json(out, report)
+
+    comparison = []
+    gated = False
+    if args.save_baseline:
+        ds.write_json(baseline_path, report)
+        print(f"✅ Baseline saved to {baseline_path}")
+    elif baseline is not None:
+        comparison = compare(report, baseline, args.threshold, args.min_delta)
+        gated = baseline.get("python") == report["python"]
+        if not gated:
+            print(f"⚠ Baseline recorded on Python {baseline.get('python')}, this run "
+                  f"is {report['python']}: compared but not gated; re-record it "
+                  "with --save-baseline where this check runs")
+        missing = ungated(report, baseline)
+        if missing:
+            print(f"⚠ Not in the baseline, not gated: {', '.join(missing)}")
+    else:
+        print(f"⚠ No baseline at {baseline_path}; run with --save-baseline to create one")
+
+    print_report(report, comparison)
+    regressions = [c for c in comparison if c[4]]
+    if regressions and not gated:
+        print(f"\n⚠ {len(regressions)} metric(s) slower by more than {args.threshold:.0%} "
+              "(not gated)")
+    elif regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed more than {args.threshold:.0%}")
+        return 1
+    print(f"\n✅ Report written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
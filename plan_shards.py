@@ -0,0 +1,411 @@
+"""
+Load-balanced shard planner for the BMS venue lists.
+
+bmsdaily1..8.py each scrape the venues in venuesN.json.  The static split
+is badly skewed (on 20260212 detailed4/5.json were >2.2 MB while others were
+a third of that) and the matrix job waits for the slowest shard.
+
+The planner estimates a cost per venue from the detailed*.json history in
+daily/data and balances the shards starting from the current venuesN.json:
+while the predicted max/mean is over TARGET_SKEW, venues move from the
+heaviest shard to the lightest, so a re-plan on unchanged data is a no-op
+and a re-plan after new data only moves a few venues.  Venues not yet in
+any shard are packed LPT (longest processing time first: heaviest venue
+goes to the currently lightest shard).
+
+    cost(venue) = VENUE_COST + average sessions per day
+
+VENUE_COST is the showtimes request every venue needs even on a day with
+no shows; each session adds one seat-layout request plus its output row.
+
+districtvenues.json (shard 9, a different provider and API) is left as is.
+
+--from-scratch ignores the current split and packs every venue LPT.  The
+venuesN.json in the repo were written that way (`--from-scratch --write`,
+which gives the same split from any starting files): on the held-out day
+it reaches max/mean 1.06, where moving venues out of the old static split
+until under TARGET_SKEW only got to 1.23.  A plain --write on them is a
+no-op until the costs drift.
+
+--write only writes the shards the scrapers read: bmsdaily<N>.py reads
+venues<N>.json, and bmsdaily9.py is the District shard, so a different
+--shards needs the scripts and the matrix to change first.
+
+Usage:
+    python plan_shards.py                # report only, latest day held out
+    python plan_shards.py --write        # rewrite venues1..N.json
+    python plan_shards.py --from-scratch --write
+    python plan_shards.py --shards 10    # what-if report for another count
+"""
+
+import argparse
+import heapq
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+import daily_summary as ds
+
+BMS_SHARDS = 8
+DISTRICT_SHARD = 9
+VENUE_COST = 1.0
+# a re-plan leaves the split alone while the predicted max/mean is under this
+TARGET_SKEW = 1.02
+
+
+# ---------------------------------------------------------------------------
+# Venue lists
+# ---------------------------------------------------------------------------
+
+def venue_file(n, root="."):
+    return Path(root) / f"venues{n}.json"
+
+
+def scraper_shards(root="."):
+    """Shard numbers with a bmsdaily<N>.py that reads venues<N>.json."""
+    found = set()
+    for p in Path(root).glob("bmsdaily*.py"):
+        n = p.stem[len("bmsdaily"):]
+        if n.isdigit() and int(n) != DISTRICT_SHARD:
+            found.add(int(n))
+    return found
+
+
+def load_venue_files(root=".", shard_count=BMS_SHARDS):
+    """{shard number: {VenueCode: venue}} for the venuesN.json on disk."""
+    out = {}
+    for n in range(1, shard_count + 1):
+        p = venue_file(n, root)
+        if p.exists():
+            with open(p, "r", encoding="utf-8") as f:
+                out[n] = json.load(f)
+    return out
+
+
+class VenueIndex:
+    """
+    Maps a detailed row back to its VenueCode(s).
+
+    Rows are matched on (name, address) across all venue files, then on a
+    name only one venue has, then on the address.  The shard a row was
+    scraped from is deliberately not used: it refers to the split that was
+    live that day, not the one in venuesN.json now, so using it would make
+    the costs depend on the current split.
+    """
+
+    def __init__(self, shards):
+        self.shard_of = {}
+        self.by_pair = defaultdict(list)
+        self.by_name = defaultdict(list)
+        self.by_address = defaultdict(list)
+        for n in sorted(shards):
+            for code, v in shards[n].items():
+                self.shard_of[code] = n
+                name, addr = v.get("VenueName"), v.get("VenueAddress")
+                self.by_pair[(name, addr)].append(code)
+                self.by_name[name].append(code)
+                self.by_address[addr].append(code)
+        for table in (self.by_pair, self.by_name, self.by_address):
+            for codes in table.values():
+                codes.sort()
+
+    def lookup(self, row):
+        """
+        Tuple of VenueCodes the row belongs to; empty if it matches none.
+        A few venues are listed twice under different codes, and some
+        complexes list each screen at one address; all those codes come
+        back and share the row.
+        """
+        name, addr = row.get("venue"), row.get("address")
+        codes = self.by_pair.get((name, addr))
+        if not codes:
+            codes = self.by_name.get(name)
+            if not codes or len(codes) > 1:
+                codes = self.by_address.get(addr)
+        return tuple(codes or ())
+
+
+# ---------------------------------------------------------------------------
+# History
+# ---------------------------------------------------------------------------
+
+def session_count(rows):
+    ids = set()
+    anonymous = 0
+    for r in rows:
+        if r.get("session_id"):
+            ids.add(r["session_id"])
+        else:
+            anonymous += 1
+    return len(ids) + anonymous
+
+
+def history_days(data_dir=ds.DATA_DIR, shard_count=BMS_SHARDS):
+    """
+    (date, {shard number or None: rows}) for every day with show rows.
+    Days that only kept finaldetailed.json come back under the key None.
+    """
+    for folder in sorted(p for p in Path(data_dir).iterdir() if p.is_dir()):
+        shards = {}
+        for n in range(1, shard_count + 1):
+            p = folder / f"detailed{n}.json"
+            if p.exists():
+                shards[n] = ds.load_rows(p)
+        if not shards:
+            p = folder / "finaldetailed.json"
+            if p.exists():
+                rows = [r for r in ds.load_rows(p) if r.get("source") == "BMS"]
+                if rows:
+                    shards[None] = rows
+        if shards:
+            yield folder.name, shards
+
+
+def venue_sessions(index, rows):
+    """
+    {VenueCode: sessions} for one day's rows, plus the unmatched row count.
+    A row matching several codes has its sessions shared evenly.
+    """
+    per_key = defaultdict(list)
+    unmatched = 0
+    for r in rows:
+        codes = index.lookup(r)
+        if codes:
+            per_key[codes].append(r)
+        else:
+            unmatched += 1
+    sessions = defaultdict(float)
+    for codes, group in per_key.items():
+        share = session_count(group) / len(codes)
+        for code in codes:
+            sessions[code] += share
+    return sessions, unmatched
+
+
+def day_rows(day_shards):
+    return [r for rows in day_shards.values() for r in rows]
+
+
+def venue_costs(index, days):
+    """
+    Average per-day cost of every venue in ``index`` over ``days``;
+    also returns how many rows could not be matched to a venue.
+    """
+    sessions = defaultdict(float)
+    unmatched = 0
+    for _, shards in days:
+        day, missed = venue_sessions(index, day_rows(shards))
+        unmatched += missed
+        for code, count in day.items():
+            sessions[code] += count
+
+    day_count = max(len(days), 1)
+    costs = {code: VENUE_COST + sessions[code] / day_count
+             for code in index.shard_of}
+    return costs, unmatched
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+def plan(costs, shard_count, current=None, target=TARGET_SKEW):
+    """
+    {VenueCode: shard number}, starting from ``current``.
+
+    Venues keep their shard unless the split is over ``target`` max/mean;
+    then venues move one at a time from the heaviest shard to the lightest
+    until it is not.  New venues (and those on shards past
+    ``shard_count``) are placed LPT-style, heaviest first onto the
+    lightest shard, which is also the whole plan when there is no
+    ``current``.  Ties break on VenueCode so the plan is deterministic.
+    """
+    current = current or {}
+    assignment = {code: n for code, n in current.items()
+                  if code in costs and 1 <= n <= shard_count}
+    loads = shard_loads(assignment, costs, shard_count)
+
+    heap = [(load, n) for n, load in loads.items()]
+    heapq.heapify(heap)
+    for code in sorted((c for c in costs if c not in assignment),
+                       key=lambda c: (-costs[c], c)):
+        load, n = heapq.heappop(heap)
+        assignment[code] = n
+        loads[n] += costs[code]
+        heapq.heappush(heap, (loads[n], n))
+
+    members = defaultdict(set)
+    for code, n in assignment.items():
+        members[n].add(code)
+    while skew(loads) > target:
+        heavy = max(loads, key=lambda n: (loads[n], -n))
+        light = min(loads, key=lambda n: (loads[n], n))
+        gap = loads[heavy] - loads[light]
+        # moving cost c turns the pair into (heavy - c, light + c), which
+        # only helps while c < gap; c nearest gap/2 evens them out best
+        movable = [c for c in members[heavy] if costs[c] < gap]
+        if not movable:
+            break
+        code = min(movable, key=lambda c: (abs(gap / 2 - costs[c]), c))
+        members[heavy].discard(code)
+        members[light].add(code)
+        assignment[code] = light
+        loads[heavy] -= costs[code]
+        loads[light] += costs[code]
+    return assignment
+
+
+def shard_loads(assignment, costs, shard_count):
+    loads = {n: 0.0 for n in range(1, shard_count + 1)}
+    for code, n in assignment.items():
+        loads[n] += costs[code]
+    return loads
+
+
+def _newline(path):
+    with open(path, "rb") as f:
+        return "\r\n" if b"\r\n" in f.read(4096) else "\n"
+
+
+def write_plan(shards, assignment, shard_count, root="."):
+    """Rewrite venues1..N.json; venues keep their current relative order."""
+    out = {n: {} for n in range(1, shard_count + 1)}
+    for n in sorted(shards):
+        for code, v in shards[n].items():
+            out[assignment[code]][code] = v
+    # the venue files are CRLF; keep whatever a file already uses so a
+    # re-plan only shows the venues that moved
+    existing = [venue_file(n, root) for n in sorted(shards)]
+    default = next((_newline(p) for p in existing if p.exists()), "\n")
+    for n, venues in out.items():
+        path = venue_file(n, root)
+        newline = _newline(path) if path.exists() else default
+        text = json.dumps(venues, indent=2, ensure_ascii=False)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(text.replace("\n", newline).encode("utf-8"))
+        tmp.replace(path)
+    stale = [p.name for p in sorted(Path(root).glob("venues*.json"))
+             if p.stem[6:].isdigit() and int(p.stem[6:]) > shard_count]
+    if stale:
+        print(f"⚠ Not part of the new plan (remove or shrink the matrix): "
+              f"{', '.join(stale)}")
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def skew(loads):
+    values = list(loads.values())
+    mean = sum(values) / len(values) if values else 0
+    return max(values) / mean if mean else 0.0
+
+
+def replay_loads(index, assignment, day_shards, shard_count):
+    """Sessions per shard if the day's rows had been scraped under ``assignment``."""
+    loads = {n: 0.0 for n in range(1, shard_count + 1)}
+    sessions, _ = venue_sessions(index, day_rows(day_shards))
+    for code, count in sessions.items():
+        loads[assignment[code]] += count
+    return loads
+
+
+def _replay(label, index, assignment, days, shard_count):
+    for date, day_shards in days:
+        loads = replay_loads(index, assignment, day_shards, shard_count)
+        cells = "  ".join(f"{n}:{loads[n]:>6.0f}" for n in sorted(loads))
+        print(f"  {date} {label} {cells}   max/mean {skew(loads):.2f}")
+
+
+def report(shards, index, costs, assignment, fit_days, held_out, shard_count):
+    current = dict(index.shard_of)
+    cur_count = max(shards)
+    cur_loads = shard_loads(current, costs, cur_count)
+    new_loads = shard_loads(assignment, costs, shard_count)
+
+    # history is replayed under each split rather than read per detailedN
+    # file: those files follow whichever split was live on the day
+    print("Current venuesN.json (sessions per day replayed under this split):")
+    _replay("replayed", index, current, fit_days + held_out, cur_count)
+    cells = "  ".join(f"{n}:{cur_loads[n]:>6.0f}" for n in sorted(cur_loads))
+    print(f"  average  predicted  {cells}   max/mean {skew(cur_loads):.2f}")
+
+    moved = sum(1 for code, n in assignment.items() if current.get(code) != n)
+    print(f"\nPlanned split over {shard_count} shards, {moved} venue(s) moved "
+          f"(target max/mean {TARGET_SKEW:.2f}, "
+          f"costs fitted on {', '.join(d for d, _ in fit_days)}):")
+    cells = "  ".join(f"{n}:{new_loads[n]:>6.0f}" for n in sorted(new_loads))
+    counts = defaultdict(int)
+    for n in assignment.values():
+        counts[n] += 1
+    print(f"  predicted  {cells}   max/mean {skew(new_loads):.2f}")
+    print("  venues     " + "  ".join(f"{n}:{counts[n]:>6}"
+                                      for n in sorted(new_loads)))
+
+    # replaying the fitted days only shows the fit; the held-out days show
+    # how the plan does on data it has not seen
+    _replay("fit     ", index, assignment, fit_days, shard_count)
+    _replay("held out", index, assignment, held_out, shard_count)
+
+
+# ---------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--shards", type=int, default=BMS_SHARDS,
+                        help="number of BMS shards in the matrix")
+    parser.add_argument("--data-dir", default=str(ds.DATA_DIR))
+    parser.add_argument("--venues-dir", default=".")
+    parser.add_argument("--holdout", type=int, default=1,
+                        help="latest days left out of the fit and replayed (0 = none)")
+    parser.add_argument("--write", action="store_true",
+                        help="rewrite venues1..N.json with the new plan")
+    parser.add_argument("--from-scratch", action="store_true",
+                        help="pack every venue LPT instead of starting from "
+                             "the current split")
+    args = parser.parse_args(argv)
+
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if args.write:
+        scrapers = scraper_shards(args.venues_dir)
+        if scrapers != set(range(1, args.shards + 1)):
+            have = ", ".join(f"bmsdaily{n}.py" for n in sorted(scrapers)) or "none"
+            parser.error(f"--write --shards {args.shards} needs bmsdaily1..{args.shards}.py "
+                         f"to read the venue files (found: {have}); venues in "
+                         f"other files would not be scraped")
+
+    shards = load_venue_files(args.venues_dir)
+    if not shards:
+        print("❌ No venuesN.json files found")
+        return 1
+
+    index = VenueIndex(shards)
+    days = list(history_days(args.data_dir))
+    # only days with per-shard files can be replayed, so hold out from those
+    per_shard = [d for d, s in days if None not in s]
+    held = set(per_shard[-args.holdout:]) if 0 < args.holdout < len(per_shard) else set()
+    fit_days = [d for d in days if d[0] not in held]
+    held_out = [d for d in days if d[0] in held]
+
+    current = None if args.from_scratch else index.shard_of
+    costs, unmatched = venue_costs(index, fit_days)
+    assignment = plan(costs, args.shards, current)
+
+    print(f"{len(costs)} venues, {len(fit_days)} day(s) fitted, "
+          f"{len(held_out)} held out, {unmatched} row(s) not matched to a venue\n")
+    report(shards, index, costs, assignment, fit_days, held_out, args.shards)
+
+    if args.write:
+        # the held-out check is done; the written plan uses every day
+        if held_out:
+            costs, _ = venue_costs(index, days)
+            assignment = plan(costs, args.shards, current)
+        write_plan(shards, assignment, args.shards, args.venues_dir)
+        print(f"\n✅ Wrote venues1..{args.shards}.json (costs from all {len(days)} days)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
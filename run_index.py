@@ -0,0 +1,306 @@
+"""
+Time-series index over daily/data/<date>/finalsummary.json.
+
+Answering "Border 2 gross by city over its full run" used to mean opening
+every day's 1-1.3 MB summary.  The index keeps one small file per movie
+under daily/index/ with its (movie, date) and (movie, city, date) series,
+running totals and changes against the previous calendar day:
+
+    daily/index/version.json         INDEX_VERSION the files were built with
+    daily/index/manifest.json        date -> sha256 of that finalsummary.json
+    daily/index/movies.json          movie -> file, first/last date, days, gross
+    daily/index/movies/<slug>.json   {"movie", "fields", "days", "cities"}
+
+"build" only re-reads the days whose finalsummary.json is new or changed
+and only rewrites the movies those days touch.  Every movie file holds its
+whole run, so the half-hourly combine passes --before <run date>: the day
+still being scraped changes on every run and would rewrite (and commit)
+every movie showing today each time.  Each day is folded in once, by the
+first combine after it closed.
+
+Usage:
+    python run_index.py build [--rebuild] [--before YYYYMMDD]
+    python run_index.py query "Border 2" [--by-city | --city Mumbai]
+    python run_index.py movies
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import daily_summary as ds
+
+INDEX_DIR = Path("daily") / "index"
+# bumped when the stored series change meaning; an older index is rebuilt
+INDEX_VERSION = 2
+
+# one entry per (movie, date) or (movie, city, date)
+FIELDS = ["date", "shows", "gross", "sold", "totalSeats", "occupancy",
+          "gross_total", "sold_total", "gross_change", "sold_change"]
+_BASE = ["shows", "gross", "sold", "totalSeats", "occupancy"]
+
+
+def _read_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def _write_compact(path, obj):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, separators=(",", ":"))
+    tmp.replace(path)
+
+
+def movie_slug(name):
+    # names can be anything ("3 ", "Border 2", "Bebe Main Badmash Banuga?"),
+    # so a short hash keeps slugs unique and filesystem-safe
+    clean = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")[:40] or "movie"
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+    return f"{clean}-{digest}"
+
+
+def previous_day(date):
+    """YYYYMMDD of the calendar day before ``date``."""
+    return (datetime.strptime(date, "%Y%m%d") - timedelta(days=1)).strftime("%Y%m%d")
+
+
+def with_running(entries):
+    """
+    ``entries``: [[date, shows, gross, sold, totalSeats, occupancy], ...]
+    Returns them date-sorted with running totals and changes appended.
+    The changes are against the previous calendar day, None when the
+    series has no entry for it (a gap in the data, or no shows that day).
+    """
+    out = []
+    gross_total = 0.0
+    sold_total = 0
+    prev = None
+    for e in sorted(entries, key=lambda e: e[0]):
+        date, shows, gross, sold, seats, occ = e[:6]
+        gross_total = round(gross_total + gross, 2)
+        sold_total += sold
+        if prev is not None and prev[0] != previous_day(date):
+            prev = None
+        gross_change = round(gross - prev[2], 2) if prev else None
+        sold_change = sold - prev[3] if prev else None
+        out.append([date, shows, gross, sold, seats, occ,
+                    gross_total, sold_total, gross_change, sold_change])
+        prev = e
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Build
+# ---------------------------------------------------------------------------
+
+class RunIndex:
+    def __init__(self, root=INDEX_DIR):
+        self.root = Path(root)
+        self.manifest = _read_json(self.root / "manifest.json", {})
+        self.catalog = _read_json(self.root / "movies.json", {})
+
+    def _movie_path(self, name):
+        entry = self.catalog.get(name)
+        slug = entry["file"] if entry else movie_slug(name)
+        return self.root / "movies" / f"{slug}.json"
+
+    def _load_movie(self, name):
+        return _read_json(self._movie_path(name), None) or {
+            "movie": name, "fields": FIELDS, "days": [], "cities": {}}
+
+    def update(self, data_dir=ds.DATA_DIR, rebuild=False, before=None):
+        """
+        Fold new or changed days into the index; returns the dates read.
+        ``before`` (YYYYMMDD) leaves that day and later ones out.
+        """
+        if _read_json(self.root / "version.json", 1) != INDEX_VERSION:
+            rebuild = True
+        if rebuild:
+            self.manifest, self.catalog = {}, {}
+            for p in (self.root / "movies").glob("*.json"):
+                p.unlink()
+
+        changed = {}
+        for folder in sorted(p for p in Path(data_dir).iterdir() if p.is_dir()):
+            if before is not None and folder.name >= before:
+                continue
+            path = folder / "finalsummary.json"
+            if not path.exists():
+                continue
+            raw = path.read_bytes()
+            digest = hashlib.sha256(raw).hexdigest()
+            if self.manifest.get(folder.name) != digest:
+                changed[folder.name] = (digest, json.loads(raw).get("movies", {}))
+        for date in set(self.manifest) - {p.name for p in Path(data_dir).iterdir()}:
+            changed[date] = (None, {})          # day folder was removed
+
+        if not changed:
+            return []
+
+        # movie -> {date: (movie entry, {city key: city entry}) or None}
+        touched = {}
+        for date, (_, movies) in changed.items():
+            for name in self._movies_on(date):
+                touched.setdefault(name, {})[date] = None
+            for name, m in movies.items():
+                cities = {f"{c['city']}|{c['state']}": [date] + [c[k] for k in _BASE]
+                          for c in m.get("City_details", [])}
+                touched.setdefault(name, {})[date] = ([date] + [m[k] for k in _BASE], cities)
+
+        for name, days in touched.items():
+            self._apply(name, days)
+
+        for date, (digest, _) in changed.items():
+            if digest is None:
+                self.manifest.pop(date, None)
+            else:
+                self.manifest[date] = digest
+
+        _write_compact(self.root / "manifest.json", dict(sorted(self.manifest.items())))
+        _write_compact(self.root / "movies.json", dict(sorted(self.catalog.items())))
+        _write_compact(self.root / "version.json", INDEX_VERSION)
+        return sorted(changed)
+
+    def _movies_on(self, date):
+        return [name for name, e in self.catalog.items() if date in e.get("dates", ())]
+
+    def _apply(self, name, days):
+        doc = self._load_movie(name)
+        movie_days = {e[0]: e[:6] for e in doc["days"]}
+        cities = {key: {e[0]: e[:6] for e in series}
+                  for key, series in doc["cities"].items()}
+
+        for date, new in days.items():
+            movie_days.pop(date, None)
+            for series in cities.values():
+                series.pop(date, None)
+            if new is not None:
+                movie_days[date] = new[0]
+                for key, entry in new[1].items():
+                    cities.setdefault(key, {})[date] = entry
+
+        path = self._movie_path(name)
+        if not movie_days:
+            path.unlink(missing_ok=True)
+            self.catalog.pop(name, None)
+            return
+
+        doc["days"] = with_running(movie_days.values())
+        doc["cities"] = {key: with_running(series.values())
+                         for key, series in sorted(cities.items()) if series}
+        _write_compact(path, doc)
+
+        dates = sorted(movie_days)
+        self.catalog[name] = {
+            "file": path.stem,
+            "first": dates[0],
+            "last": dates[-1],
+            "dates": dates,
+            "gross_total": doc["days"][-1][FIELDS.index("gross_total")],
+        }
+
+    # -----------------------------------------------------------------------
+    # Queries
+    # -----------------------------------------------------------------------
+
+    def movies(self):
+        return self.catalog
+
+    def _find(self, movie):
+        if movie in self.catalog:
+            return movie
+        # forgiving lookup: case and surrounding spaces
+        wanted = movie.strip().lower()
+        for name in self.catalog:
+            if name.strip().lower() == wanted:
+                return name
+        raise KeyError(movie)
+
+    def movie_series(self, movie):
+        """[{date, shows, gross, ..., gross_change, sold_change}, ...]"""
+        doc = self._load_movie(self._find(movie))
+        return [dict(zip(FIELDS, e)) for e in doc["days"]]
+
+    def city_series(self, movie, city=None):
+        """{(city, state): [entries]}; ``city`` filters by name (any state)."""
+        doc = self._load_movie(self._find(movie))
+        out = {}
+        for key, series in doc["cities"].items():
+            name, state = key.split("|", 1)
+            if city is None or name.lower() == city.lower():
+                out[(name, state)] = [dict(zip(FIELDS, e)) for e in series]
+        return out
+
+
+# ---------------------------------------------------------------------------
+
+def _print_series(entries, indent=""):
+    print(f"{indent}{'date':<9} {'shows':>6} {'gross':>14} {'sold':>8} "
+          f"{'occ%':>6} {'gross total':>15} {'change':>13}")
+    for e in entries:
+        change = "" if e["gross_change"] is None else f"{e['gross_change']:+,.0f}"
+        print(f"{indent}{e['date']:<9} {e['shows']:>6} {e['gross']:>14,.0f} "
+              f"{e['sold']:>8} {e['occupancy']:>6} {e['gross_total']:>15,.0f} "
+              f"{change:>13}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["build", "query", "movies"])
+    parser.add_argument("movie", nargs="?")
+    parser.add_argument("--data-dir", default=str(ds.DATA_DIR))
+    parser.add_argument("--index-dir", default=str(INDEX_DIR))
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--before", help="build: only days before YYYYMMDD")
+    parser.add_argument("--by-city", action="store_true")
+    parser.add_argument("--city")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    index = RunIndex(args.index_dir)
+
+    if args.command == "build":
+        dates = index.update(args.data_dir, rebuild=args.rebuild, before=args.before)
+        print(f"✅ Index: {len(dates)} day(s) folded in, "
+              f"{len(index.catalog)} movies, {time.perf_counter() - t0:.2f}s")
+        return 0
+
+    if args.command == "movies":
+        for name, e in sorted(index.movies().items(),
+                              key=lambda kv: -kv[1]["gross_total"]):
+            print(f"{e['gross_total']:>15,.0f}  {e['first']}..{e['last']}  {name}")
+        return 0
+
+    if not args.movie:
+        parser.error("query needs a movie name")
+    try:
+        if args.by_city or args.city:
+            series = index.city_series(args.movie, args.city)
+            elapsed = time.perf_counter() - t0
+            for (city, state), entries in sorted(
+                    series.items(), key=lambda kv: -kv[1][-1]["gross_total"]):
+                print(f"{city}, {state}")
+                _print_series(entries, "  ")
+        else:
+            entries = index.movie_series(args.movie)
+            elapsed = time.perf_counter() - t0
+            _print_series(entries)
+    except KeyError:
+        print(f"❌ {args.movie!r} is not in the index")
+        return 1
+    print(f"({elapsed * 1000:.1f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,414 @@
+"""
+Per-run timing and throughput metrics for the pipeline scripts.
+
+bmsdaily*.py, combine_dailyshards.py and cleanup_shard_files.py are
+obfuscated, so they are measured from outside: "run" starts the script as
+a child process, exactly as the workflow would, and samples it
+
+    memory   VmRSS from /proc/<pid>/status while it runs; the peak comes
+             from getrusage(RUSAGE_CHILDREN) once it has exited
+    io       /proc/<pid>/io (bytes read/written, also what went to disk),
+             read one last time after exit, before the child is reaped
+    cpu      user + system seconds (RUSAGE_CHILDREN)
+    network  the summary of every FetchPool the script closed (requests,
+             retries, errors, latency percentiles, busy time); the pool
+             writes it to the file named by FETCH_METRICS
+    records  rows in each --output file after the run (movies for a
+             finalsummary.json), or the rows of the --input files when
+             given: the combine reads 26k show rows to write 225 movies
+
+The split of a run into stages comes from inside the child:
+metrics_hook/ goes first on its PYTHONPATH, so its sitecustomize.py times
+aiohttp/requests traffic ("network"), json.load(s) ("parse") and
+json.dump(s) ("write") and leaves the figures in the file named by
+RUN_STAGES.  The script file itself is run unchanged.
+
+One JSON file per run goes to daily/data/<date>/metrics/
+<name>-<HHMMSS>.json with wall time, records/sec, bytes written, peak RSS,
+the stages and exit status.  The script's exit code is passed through, and
+a failure while collecting metrics is reported but never changes it.
+Without /proc (macOS) only wall time, cpu, peak RSS and the stages are
+recorded.
+
+Usage:
+    python run_metrics.py run --name shard4 --date 20260212 \\
+        --output detailed4.json bmsdaily4.py [script args]
+    python run_metrics.py run --name combine --input 'detailed*.json' \\
+        --output finalsummary.json incremental_combine.py
+    python run_metrics.py report [--date 20260212] [--name shard4]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import daily_summary as ds
+from json_stream import iter_rows
+from latency import busy_time, percentile
+
+SAMPLE_EVERY = 0.2      # seconds
+HOOK_DIR = Path(__file__).resolve().parent / "metrics_hook"
+
+
+class Stage:
+    __slots__ = ("name", "wall", "calls", "records", "bytes", "errors",
+                 "latencies", "intervals")
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.calls = 0
+        self.records = 0
+        self.bytes = 0
+        self.errors = 0
+        self.latencies = []
+        self.intervals = []
+
+    def to_dict(self):
+        out = {"wall_s": round(self.wall, 3), "calls": self.calls}
+        if self.records:
+            out["records"] = self.records
+            out["records_per_s"] = round(self.records / self.wall, 1) if self.wall else None
+        if self.bytes:
+            out["bytes"] = self.bytes
+        if self.intervals or self.latencies:
+            out["wall_s"] = round(busy_time(self.intervals), 3)
+            out["errors"] = self.errors
+            for pct in (50, 95, 99):
+                v = percentile(self.latencies, pct)
+                out[f"p{pct}_ms"] = None if v is None else round(v * 1000, 1)
+        return out
+
+
+class RunMetrics:
+    def __init__(self, name, date=None, data_dir=ds.DATA_DIR):
+        self.name = name
+        self.date = date or ds.today_ist()
+        self.data_dir = data_dir
+        self.started = datetime.now(ds.IST)
+        self.stages = {}
+        self._t0 = time.perf_counter()
+
+    def get(self, name):
+        st = self.stages.get(name)
+        if st is None:
+            st = self.stages[name] = Stage(name)
+        return st
+
+    def add_stages(self, raw):
+        """Fold in the {stage: figures} the child's sitecustomize wrote."""
+        for name, fig in raw.items():
+            st = self.get(name)
+            st.wall += fig.get("wall", 0.0)
+            st.calls += fig.get("calls", 0)
+            st.records += fig.get("records", 0)
+            st.bytes += fig.get("bytes", 0)
+            st.errors += fig.get("errors", 0)
+            st.latencies.extend(fig.get("latencies", ()))
+            st.intervals.extend(tuple(span) for span in fig.get("intervals", ()))
+
+    def to_dict(self, status="ok", exit_code=0, process=None):
+        wall = time.perf_counter() - self._t0
+        process = process or {}
+        records = process.get("records", 0)
+        return {
+            "name": self.name,
+            "date": self.date,
+            "started": self.started.isoformat(timespec="seconds"),
+            "status": status,
+            "exit_code": exit_code,
+            "wall_s": round(wall, 3),
+            "records": records,
+            "records_per_s": round(records / wall, 1) if wall else None,
+            **{k: v for k, v in process.items() if k != "records"},
+            "stages": {k: st.to_dict() for k, st in self.stages.items()},
+        }
+
+    def write(self, status="ok", exit_code=0, process=None):
+        folder = ds.day_dir(self.date, self.data_dir) / "metrics"
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f"{self.name}-{self.started.strftime('%H%M%S')}.json"
+        ds.write_json(path, self.to_dict(status, exit_code, process))
+        return path
+
+
+# ---------------------------------------------------------------------------
+# Watching a child process
+# ---------------------------------------------------------------------------
+
+def _proc_fields(pid, name, keys):
+    """{key: int} from /proc/<pid>/<name>; {} when unavailable."""
+    out = {}
+    try:
+        with open(f"/proc/{pid}/{name}", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in keys:
+                    out[key] = int(value.split()[0])
+    except (OSError, ValueError):
+        pass
+    return out
+
+
+IO_KEYS = ("rchar", "wchar", "read_bytes", "write_bytes")
+
+
+class Watcher:
+    """Samples a running child's RSS and io until it exits."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.rss_kb = []
+        self.io = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = _proc_fields(self.pid, "status", ("VmRSS",)).get("VmRSS")
+            if rss is not None:
+                self.rss_kb.append(rss)
+            self.io = _proc_fields(self.pid, "io", IO_KEYS) or self.io
+            self._stop.wait(SAMPLE_EVERY)
+
+    def finish(self):
+        """Call after the child exited but before it is reaped."""
+        self._stop.set()
+        self._thread.join()
+        self.io = _proc_fields(self.pid, "io", IO_KEYS) or self.io
+
+
+def _wait_unreaped(proc):
+    """Block until ``proc`` exits, leaving it a zombie so /proc stays readable."""
+    if hasattr(os, "waitid"):
+        os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+
+
+def _rusage_mb(ru):
+    # kilobytes on Linux, bytes on macOS
+    return ru.ru_maxrss / (1 << 20) if sys.platform == "darwin" else ru.ru_maxrss / 1024
+
+
+def count_records(path):
+    """Rows of a detailed/finaldetailed file, movies of a finalsummary.json."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("data", data.get("movies", data))
+    return len(data)
+
+
+def count_rows(path):
+    """Rows of a detailed/finaldetailed file, streamed (inputs can be large)."""
+    return sum(1 for _ in iter_rows(path))
+
+
+def read_stages(path):
+    """Stage figures the child's sitecustomize left behind; {} if none."""
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_pool_summaries(path):
+    """FetchPool summaries the child wrote (one JSON object per line)."""
+    pools = []
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            pools = [json.loads(line) for line in f if line.strip()]
+    if not pools:
+        return None
+    net = {k: sum(p.get(k, 0) for p in pools)
+           for k in ("requests", "attempts", "retries", "errors", "coalesced",
+                     "memo_hits", "bytes")}
+    net["busy_s"] = round(sum(p.get("busy_s", 0) for p in pools), 3)
+    # per-pool percentiles cannot be merged; the busiest pool stands in
+    main = max(pools, key=lambda p: p.get("requests", 0))
+    for pct in (50, 95, 99):
+        net[f"p{pct}_ms"] = main.get(f"p{pct}_ms")
+    net["pools"] = len(pools)
+    return net
+
+
+def _collect(m, code, ru, base, watcher, outputs, before, pool_file, stage_file,
+             inputs=()):
+    network = read_pool_summaries(pool_file)
+    m.add_stages(read_stages(stage_file))
+    status = "ok" if code == 0 else ("failed" if code > 0 else "killed")
+    process = {
+        "cpu_s": round(ru.ru_utime - base.ru_utime + ru.ru_stime - base.ru_stime, 3),
+        "peak_rss_mb": round(_rusage_mb(ru), 1),
+        "rss_samples": len(watcher.rss_kb),
+        "bytes_written": watcher.io.get("wchar"),
+        "disk_write_bytes": watcher.io.get("write_bytes"),
+        "bytes_read": watcher.io.get("rchar"),
+        "outputs": {},
+    }
+    records = 0
+    for p in outputs:
+        if p.exists() and p.stat().st_mtime_ns != before.get(p):
+            try:
+                n = count_records(p)
+            except (OSError, ValueError) as e:
+                # a run that died mid-write leaves a truncated file behind
+                process["outputs"][p.name] = {"error": str(e), "bytes": p.stat().st_size}
+                continue
+            process["outputs"][p.name] = {"records": n, "bytes": p.stat().st_size}
+            records += n
+        else:
+            process["outputs"][p.name] = None        # not written by this run
+    if inputs:
+        process["inputs"] = {}
+        records = 0
+        for p in inputs:
+            n = count_rows(p)
+            process["inputs"][p.name] = {"records": n, "bytes": p.stat().st_size}
+            records += n
+    process["records"] = records
+    if network:
+        process["network"] = network
+
+    path = m.write(status, code, process)
+    requests = (f"{network['requests']} requests (p95 {network['p95_ms']} ms), "
+                if network else "")
+    print(f"📊 {m.name}: {m.to_dict()['wall_s']:.1f}s, {requests}{records} records, "
+          f"peak {process['peak_rss_mb']} MB -> {path}")
+
+
+def run_script(name, script, args=(), date=None, outputs=(), data_dir=ds.DATA_DIR,
+               inputs=()):
+    """
+    Run ``script`` in a child interpreter and record it; returns its exit
+    code.  ``inputs`` are glob patterns in the day folder whose rows, when
+    given, count as the run's records.  Metrics are best effort: if
+    collecting or writing them fails the run still returns the script's
+    own exit code.
+    """
+    m = RunMetrics(name, date, data_dir)
+    try:
+        day = ds.day_dir(m.date, data_dir)
+        outputs = [day / o for o in outputs]
+        before = {p: p.stat().st_mtime_ns if p.exists() else None for p in outputs}
+    except Exception as e:
+        print(f"⚠ {name}: output files not checked ({e!r})")
+        outputs, before = [], {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool_file = Path(tmp) / "fetch.jsonl"
+        stage_file = Path(tmp) / "stages.json"
+        path = os.pathsep.join(p for p in (str(HOOK_DIR), os.environ.get("PYTHONPATH")) if p)
+        env = dict(os.environ, FETCH_METRICS=str(pool_file),
+                   RUN_STAGES=str(stage_file), PYTHONPATH=path)
+        base = resource.getrusage(resource.RUSAGE_CHILDREN)
+        proc = subprocess.Popen([sys.executable, script, *args], env=env)
+        watcher = Watcher(proc.pid).start()
+        try:
+            _wait_unreaped(proc)
+        except KeyboardInterrupt:
+            proc.terminate()
+        watcher.finish()
+        code = proc.wait()
+        ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+        try:
+            inputs = sorted(p for pattern in inputs
+                            for p in ds.day_dir(m.date, data_dir).glob(pattern))
+            _collect(m, code, ru, base, watcher, outputs, before, pool_file,
+                     stage_file, inputs)
+        except Exception as e:
+            # instrumentation must never change the job's outcome
+            print(f"⚠ {name}: metrics not recorded ({e!r})")
+
+    return code if code >= 0 else 128 - code
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def load_runs(date, data_dir=ds.DATA_DIR, name=None):
+    folder = ds.day_dir(date, data_dir) / "metrics"
+    runs = []
+    for p in sorted(folder.glob("*.json")):
+        with open(p, "r", encoding="utf-8") as f:
+            r = json.load(f)
+        if name is None or r["name"] == name:
+            runs.append(r)
+    return sorted(runs, key=lambda r: (r["started"], r["name"]))
+
+
+def report(runs):
+    print(f"{'started':<20} {'name':<10} {'wall s':>7} {'cpu s':>6} {'net s':>6} "
+          f"{'parse s':>7} {'write s':>7} {'reqs':>6} {'retries':>7} {'p95 ms':>7} "
+          f"{'records':>8} {'rec/s':>8} {'MB out':>7} {'RSS MB':>7}  status")
+    for r in runs:
+        stages = r.get("stages") or {}
+        # FetchPool's own summary knows about retries; the hook's network
+        # stage covers every aiohttp/requests call
+        net = r.get("network") or {}
+        hooked = stages.get("network") or {}
+        net_s = net.get("busy_s", hooked.get("wall_s", 0))
+        reqs = net.get("requests", hooked.get("calls", 0))
+        p95 = net.get("p95_ms", hooked.get("p95_ms"))
+        written = r.get("bytes_written") or 0
+        print(f"{r['started'][:19]:<20} {r['name']:<10} {r['wall_s']:>7.1f} "
+              f"{r.get('cpu_s') or 0:>6.1f} {net_s:>6.1f} "
+              f"{stages.get('parse', {}).get('wall_s', 0):>7.1f} "
+              f"{stages.get('write', {}).get('wall_s', 0):>7.1f} "
+              f"{reqs:>6} {net.get('retries', 0):>7} "
+              f"{str(p95 or ''):>7} {r['records']:>8} "
+              f"{str(r['records_per_s'] or ''):>8} {written / 1e6:>7.1f} "
+              f"{r.get('peak_rss_mb') or '':>7}  {r['status']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run a script and record its metrics")
+    run.add_argument("--name", help="run name (shard4, combine, cleanup, ...)")
+    run.add_argument("--date", help="YYYYMMDD the run belongs to (default: today IST)")
+    run.add_argument("--output", action="append", default=[],
+                     help="file the script writes, relative to the day folder; "
+                          "its rows are the run's records (repeatable)")
+    run.add_argument("--input", action="append", default=[],
+                     help="glob of files the script reads, relative to the day "
+                          "folder; when given their rows are the run's records "
+                          "instead (repeatable)")
+    run.add_argument("--data-dir", default=str(ds.DATA_DIR))
+    run.add_argument("script")
+    run.add_argument("args", nargs=argparse.REMAINDER)
+
+    rep = sub.add_parser("report", help="table of the runs of one day")
+    rep.add_argument("--date", help="YYYYMMDD (default: today IST)")
+    rep.add_argument("--name")
+    rep.add_argument("--data-dir", default=str(ds.DATA_DIR))
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        name = args.name or Path(args.script).stem
+        return run_script(name, args.script, args.args, args.date, args.output,
+                          args.data_dir, args.input)
+
+    runs = load_runs(args.date or ds.today_ist(), args.data_dir, args.name)
+    if not runs:
+        print("❌ No metrics for that day")
+        return 1
+    report(runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,505 @@
+"""
+Columnar, zstd-compressed archive of the show-level data.
+
+One file per date, daily/archive/<date>.zcol.  Every detailed*.json (or
+finaldetailed.json) converted into it becomes one *segment*:
+
+    file     = MAGIC segment*
+    segment  = b"SEG1" <u32 header length> <header JSON> <column blobs>
+
+Each column blob is a separate zstd frame:
+
+    string columns   dictionary encoded -> uint8/16/32 codes + a string table
+    number columns   int64 / float64 arrays (little endian); a null holds 0
+
+Which keys a row has, in which order, and whether a value was an int, a
+float or null is kept as a per-row "layout" code, so export gives back
+exactly the JSON the shards wrote.  finaldetailed.json's last_updated goes in the
+segment header.  The file is append-only: converting a newer snapshot
+of the same shard appends a segment and readers use the last one per name.
+Readers mmap the file and only decompress the columns they ask for.
+
+Usage:
+    python show_archive.py convert [--date D | --all]
+    python show_archive.py export --date D [--out DIR]
+    python show_archive.py check  [--date D | --all]    # lossless round trip
+    python show_archive.py stats  [--date D | --all]    # size / load time
+"""
+
+import argparse
+import json
+import mmap
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+
+import zstandard
+
+import daily_summary as ds
+
+ARCHIVE_DIR = Path("daily") / "archive"
+MAGIC = b"DBOCOL1\n"
+SEGMENT_TAG = b"SEG1"
+ZSTD_LEVEL = 10
+
+LITTLE = sys.byteorder == "little"
+
+
+def archive_path(date, archive_dir=ARCHIVE_DIR):
+    return Path(archive_dir) / f"{date}.zcol"
+
+
+def source_files(folder):
+    """Shard files of a day; older days only kept finaldetailed.json."""
+    paths = ds.shard_paths(folder)
+    if not paths:
+        final = Path(folder) / "finaldetailed.json"
+        if final.exists():
+            paths = [final]
+    return paths
+
+
+def read_source(path):
+    """(rows, last_updated) of a source file; last_updated is None for shards."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return data.get("data", []), data.get("last_updated")
+    return data, None
+
+
+# ---------------------------------------------------------------------------
+# Encoding
+# ---------------------------------------------------------------------------
+
+def _typed(values, typecode):
+    arr = array(typecode, values)
+    if not LITTLE:
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _codes_typecode(size):
+    if size <= 0xFF:
+        return "B"
+    if size <= 0xFFFF:
+        return "H"
+    return "I"
+
+
+def _value_tag(value):
+    # bool before int: True is an int in Python
+    if value is None:
+        return "n"
+    if isinstance(value, bool):
+        return "j"
+    if isinstance(value, int):
+        return "i"
+    if isinstance(value, float):
+        return "f"
+    if isinstance(value, str):
+        return "s"
+    return "j"
+
+
+INT64_MIN, INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+def _fits(value, int_column):
+    """Whether ``value`` survives an int64 (or float64) column unchanged."""
+    if isinstance(value, float):
+        return True
+    if int_column:
+        return INT64_MIN <= value <= INT64_MAX
+    try:
+        return int(float(value)) == value
+    except OverflowError:
+        return False
+
+
+def encode_segment(name, rows, level=ZSTD_LEVEL, last_updated=None):
+    """Bytes of one segment holding ``rows`` (a list of flat dicts)."""
+    cctx = zstandard.ZstdCompressor(level=level)
+
+    layouts, layout_codes = {}, []
+    columns = {}                     # key -> column info, first-seen order
+    for row in rows:
+        layout = []
+        for key, value in row.items():
+            tag = _value_tag(value)
+            layout.append((key, tag))
+            columns.setdefault(key, {})
+        layout = tuple(layout)
+        layout_codes.append(layouts.setdefault(layout, len(layouts)))
+
+    # A column is numeric if every present value is null or an int or float
+    # that its typed array holds exactly (the layouts mark the nulls, e.g.
+    # minutes_left once a show started); anything else (strings, odd
+    # types, ints past int64 or, next to floats, past 2**53) is
+    # dictionary encoded.
+    for key, col in columns.items():
+        present = [row[key] for row in rows if key in row and row[key] is not None]
+        tags = {_value_tag(v) for v in present}
+        col["int"] = tags == {"i"}
+        col["numeric"] = (bool(tags) and tags <= {"i", "f"}
+                          and all(_fits(v, col["int"]) for v in present))
+        col["values"] = [row.get(key) for row in rows]
+
+    blobs = []
+    offset = 0
+
+    def put(data):
+        nonlocal offset
+        frame = cctx.compress(data)
+        blobs.append(frame)
+        start, offset = offset, offset + len(frame)
+        return [start, len(frame)]
+
+    meta = []
+    for key, col in columns.items():
+        if col["numeric"]:
+            values = [0 if v is None else v for v in col["values"]]
+            if col["int"]:
+                meta.append({"key": key, "kind": "q", "data": put(_typed(values, "q"))})
+            else:
+                meta.append({"key": key, "kind": "d",
+                             "data": put(_typed([float(v) for v in values], "d"))})
+        else:
+            table, codes = {}, []
+            for v in col["values"]:
+                text = v if isinstance(v, str) else json.dumps(v)
+                codes.append(table.setdefault(text, len(table)))
+            typecode = _codes_typecode(len(table))
+            meta.append({
+                "key": key, "kind": "dict", "codes": typecode,
+                "data": put(_typed(codes, typecode)),
+                "table": put(json.dumps(list(table), ensure_ascii=False).encode("utf-8")),
+            })
+
+    layout_typecode = _codes_typecode(len(layouts))
+    header = {
+        "name": name,
+        "rows": len(rows),
+        "layouts": [list(map(list, layout)) for layout in layouts],
+        "layout_codes": [layout_typecode, put(_typed(layout_codes, layout_typecode))],
+        "columns": meta,
+    }
+    if last_updated is not None:
+        header["last_updated"] = last_updated
+    head = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return SEGMENT_TAG + struct.pack("<I", len(head)) + head + b"".join(blobs)
+
+
+def append_segment(path, name, rows, last_updated=None):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    new = not path.exists() or path.stat().st_size == 0
+    with open(path, "ab") as f:
+        if new:
+            f.write(MAGIC)
+        f.write(encode_segment(name, rows, last_updated=last_updated))
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def _null(_):
+    return None
+
+
+class Segment:
+    def __init__(self, archive, header, base):
+        self._archive = archive
+        self.header = header
+        self.base = base
+        self.name = header["name"]
+        self.rows = header["rows"]
+        self.last_updated = header.get("last_updated")
+        self.columns = {c["key"]: c for c in header["columns"]}
+
+    def _blob(self, span):
+        start, length = span
+        start += self.base
+        return self._archive.dctx.decompress(self._archive.buf[start:start + length])
+
+    def _array(self, typecode, span):
+        arr = array(typecode)
+        arr.frombytes(self._blob(span))
+        if not LITTLE:
+            arr.byteswap()
+        return arr
+
+    def column(self, key):
+        """
+        Raw column: an ``array`` for number columns, or (codes, table)
+        for dictionary-encoded ones.
+        """
+        col = self.columns[key]
+        if col["kind"] == "dict":
+            table = json.loads(self._blob(col["table"]))
+            return self._array(col["codes"], col["data"]), table
+        return self._array(col["kind"], col["data"])
+
+    def values(self, key):
+        """
+        Decoded column, one value per row.  Rows that lack the key, and
+        nulls in a number column, hold a placeholder (0 or the first table
+        entry); the layouts say which.
+        """
+        col = self.column(key)
+        if isinstance(col, tuple):
+            codes, table = col
+            return [table[c] for c in codes]
+        return col.tolist()
+
+    def to_rows(self):
+        layouts = self.header["layouts"]
+        typecode, span = self.header["layout_codes"]
+        layout_codes = self._array(typecode, span)
+        values = {key: self.values(key) for key in self.columns}
+
+        # per layout: (key, column values, converter or None).  A dict
+        # column stores strings as themselves and every other value as its
+        # JSON text; a float column also carries the ints of a mixed column.
+        plans = []
+        for layout in layouts:
+            plan = []
+            for key, tag in layout:
+                kind = self.columns[key]["kind"]
+                if kind == "dict":
+                    convert = None if tag == "s" else json.loads
+                elif tag == "n":
+                    convert = _null
+                elif tag == "i" and kind == "d":
+                    convert = int
+                else:
+                    convert = None
+                plan.append((key, values[key], convert))
+            plans.append(plan)
+
+        rows = []
+        for i, code in enumerate(layout_codes):
+            row = {}
+            for key, column, convert in plans[code]:
+                row[key] = column[i] if convert is None else convert(column[i])
+            rows.append(row)
+        return rows
+
+
+class Archive:
+    """Read-only, memory-mapped view of one .zcol file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self._map)
+        self.dctx = zstandard.ZstdDecompressor()
+        if bytes(self.buf[:len(MAGIC)]) != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a show archive")
+        self.segments = list(self._scan())
+
+    def _scan(self):
+        pos = len(MAGIC)
+        end = len(self.buf)
+        while pos < end:
+            if bytes(self.buf[pos:pos + 4]) != SEGMENT_TAG:
+                raise ValueError(f"{self.path}: bad segment at byte {pos}")
+            (head_len,) = struct.unpack_from("<I", self.buf, pos + 4)
+            head_start = pos + 8
+            header = json.loads(bytes(self.buf[head_start:head_start + head_len]))
+            base = head_start + head_len
+            seg = Segment(self, header, base)
+            yield seg
+            pos = base + sum(span[1] for span in _spans(header))
+
+    def latest(self):
+        """{name: segment} using the most recently appended segment per name."""
+        out = {}
+        for seg in self.segments:
+            out[seg.name] = seg
+        return out
+
+    def rows(self):
+        return [row for seg in self.latest().values() for row in seg.to_rows()]
+
+    def close(self):
+        self.buf.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _spans(header):
+    yield header["layout_codes"][1]
+    for col in header["columns"]:
+        yield col["data"]
+        if "table" in col:
+            yield col["table"]
+
+
+# ---------------------------------------------------------------------------
+# Convert / export
+# ---------------------------------------------------------------------------
+
+def convert_day(folder, archive_dir=ARCHIVE_DIR):
+    """
+    Append one segment per source file of the day that is not archived yet.
+    Returns the archive path, or None if the day has no show rows.
+    """
+    folder = Path(folder)
+    sources = [(p, *read_source(p)) for p in source_files(folder)]
+    sources = [s for s in sources if s[1]]
+    if not sources:
+        return None
+    target = archive_path(folder.name, archive_dir)
+    for p, rows, last_updated in sources:
+        if target.exists():
+            with Archive(target) as arc:
+                seg = arc.latest().get(p.name)
+                if (seg is not None and seg.rows == len(rows)
+                        and seg.last_updated == last_updated
+                        and seg.to_rows() == rows):
+                    continue
+        append_segment(target, p.name, rows, last_updated)
+    return target
+
+
+def _document(name, seg):
+    """What the source file held: the rows, wrapped for finaldetailed.json."""
+    rows = seg.to_rows()
+    if name == "finaldetailed.json":
+        return {"last_updated": seg.last_updated, "data": rows}
+    return rows
+
+
+def export_day(date, out_dir, archive_dir=ARCHIVE_DIR):
+    """Write the archived files of ``date`` back as JSON under ``out_dir``."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    with Archive(archive_path(date, archive_dir)) as arc:
+        for name, seg in arc.latest().items():
+            ds.write_json(out_dir / name, _document(name, seg))
+            written.append(out_dir / name)
+    return written
+
+
+def check_day(folder, archive_dir=ARCHIVE_DIR):
+    """True if every source file re-serialises byte-for-byte from the archive."""
+    folder = Path(folder)
+    target = archive_path(folder.name, archive_dir)
+    if not target.exists():
+        return not any(ds.load_rows(p) for p in source_files(folder))
+    with Archive(target) as arc:
+        latest = arc.latest()
+        for p in source_files(folder):
+            if p.name not in latest:
+                if ds.load_rows(p):
+                    return False
+                continue
+            if ds.dump_bytes(_document(p.name, latest[p.name])) != p.read_bytes():
+                return False
+    return True
+
+
+def stats_day(folder, archive_dir=ARCHIVE_DIR):
+    folder = Path(folder)
+    paths = source_files(folder)
+    json_bytes = sum(p.stat().st_size for p in paths)
+    target = archive_path(folder.name, archive_dir)
+    if not target.exists():
+        return None
+
+    t0 = time.perf_counter()
+    count = sum(len(ds.load_rows(p)) for p in paths)
+    t1 = time.perf_counter()
+    with Archive(target) as arc:
+        rows = arc.rows()
+        t2 = time.perf_counter()
+        sold = [seg.column("sold") for seg in arc.latest().values()
+                if "sold" in seg.columns]
+        t3 = time.perf_counter()
+    assert len(rows) == count
+    return {
+        "rows": count,
+        "json_bytes": json_bytes,
+        "archive_bytes": target.stat().st_size,
+        "json_load_s": t1 - t0,
+        "archive_load_s": t2 - t1,
+        "column_load_s": t3 - t2,
+        "columns_read": len(sold),
+    }
+
+
+# ---------------------------------------------------------------------------
+
+def _days(args):
+    data_dir = Path(args.data_dir)
+    if args.date:
+        return [data_dir / args.date]
+    if args.all:
+        return sorted(p for p in data_dir.iterdir() if p.is_dir() and source_files(p))
+    return [data_dir / ds.today_ist()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["convert", "export", "check", "stats"])
+    parser.add_argument("--date", help="YYYYMMDD (default: today IST)")
+    parser.add_argument("--all", action="store_true", help="every day with shard files")
+    parser.add_argument("--data-dir", default=str(ds.DATA_DIR))
+    parser.add_argument("--archive-dir", default=str(ARCHIVE_DIR))
+    parser.add_argument("--out", help="export directory (default: <archive-dir>/<date>)")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        date = args.date or ds.today_ist()
+        out = args.out or str(Path(args.archive_dir) / date)
+        for p in export_day(date, out, args.archive_dir):
+            print(f"✅ {p}")
+        return 0
+
+    ok = True
+    totals = {"json_bytes": 0, "archive_bytes": 0, "json_load_s": 0.0,
+              "archive_load_s": 0.0, "column_load_s": 0.0}
+    for folder in _days(args):
+        if args.command == "convert":
+            target = convert_day(folder, args.archive_dir)
+            print(f"{folder.name}: {target or 'no shard files'}")
+        elif args.command == "check":
+            good = check_day(folder, args.archive_dir)
+            ok &= good
+            print(f"{folder.name}: {'OK' if good else 'MISMATCH'}")
+        else:
+            s = stats_day(folder, args.archive_dir)
+            if s is None:
+                print(f"{folder.name}: nothing archived")
+                continue
+            for k in totals:
+                totals[k] += s[k]
+            print(f"{folder.name}: {s['rows']:>7} rows  "
+                  f"json {s['json_bytes'] / 1e6:6.2f} MB -> {s['archive_bytes'] / 1e6:5.2f} MB  "
+                  f"load json {s['json_load_s'] * 1000:6.0f} ms  "
+                  f"archive {s['archive_load_s'] * 1000:6.0f} ms  "
+                  f"one column {s['column_load_s'] * 1000:4.1f} ms")
+    if args.command == "stats" and totals["archive_bytes"]:
+        print(f"total: json {totals['json_bytes'] / 1e6:.2f} MB -> "
+              f"{totals['archive_bytes'] / 1e6:.2f} MB "
+              f"({totals['json_bytes'] / totals['archive_bytes']:.1f}x), "
+              f"load {totals['json_load_s']:.2f}s -> {totals['archive_load_s']:.2f}s "
+              f"(one column {totals['column_load_s'] * 1000:.1f} ms)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""
+Delta log for the half-hourly shard snapshots.
+
+Every run rewrites detailedN.json in full although most sessions did not
+change.  This keeps, per shard and day, an append-only JSON Lines log in
+daily/data/<date>/deltas/detailedN.jsonl:
+
+    {"kind": "checkpoint", "at": ts, "rows": [...]}            full snapshot
+    {"kind": "delta", "at": ts,
+     "upsert": [[id, row], ...],      sessions that are new or changed
+     "remove": [id, ...],             sessions that disappeared
+     "order": null | [id, ...],       only when not "old order + new at end"
+     "volatile": {"minutes_left": [...]}}
+
+Sessions are numbered in order of first appearance (ids restart at every
+checkpoint).  minutes_left moves on every run for every show, so it is not
+treated as a change; its values ride along as one compact column per run.
+A checkpoint is written every CHECKPOINT_EVERY runs so a reconstruction
+never has to replay the whole day.
+
+Usage:
+    python snapshot_delta.py record  --shard 4 --date 20260212   # after the scraper ran
+    python snapshot_delta.py restore --shard 4 --date 20260212 [--at 18:30]
+    python snapshot_delta.py restore --all --date 20260212
+    python snapshot_delta.py restore --all --all-days  # every day with a log
+    python snapshot_delta.py restore --all --unarchived  # days cleanup archives
+    python snapshot_delta.py check   --shard 4         # log == detailed4.json
+    python snapshot_delta.py history --shard 4         # sales per run
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import daily_summary as ds
+
+CHECKPOINT_EVERY = 12          # 6 hours of half-hourly runs
+VOLATILE = ("minutes_left",)
+
+
+def log_path(folder, shard):
+    return Path(folder) / "deltas" / f"detailed{shard}.jsonl"
+
+
+def now_ist():
+    return datetime.now(ds.IST).isoformat(timespec="seconds")
+
+
+def _keyed(rows):
+    """[(session key, row)] with a #n suffix on repeated keys."""
+    seen = {}
+    out = []
+    for row in rows:
+        key = ds.session_key(row)
+        n = seen.get(key, 0) + 1
+        seen[key] = n
+        out.append((key if n == 1 else f"{key}#{n}", row))
+    return out
+
+
+def _stable(row):
+    # key order and presence count, volatile values do not
+    return [(k, None if k in VOLATILE else v) for k, v in row.items()]
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+class Snapshot:
+    """One shard at one point of the day, rebuilt from the log."""
+
+    def __init__(self):
+        self.rows = {}        # id -> row
+        self.ids = {}         # session key -> id
+        self.order = []
+        self.at = None
+        self.since_checkpoint = 0
+
+    def checkpoint(self, rec):
+        self.rows, self.ids, self.order = {}, {}, []
+        for key, row in _keyed(rec["rows"]):
+            i = len(self.ids)
+            self.ids[key] = i
+            self.rows[i] = row
+            self.order.append(i)
+        self.at = rec["at"]
+        self.since_checkpoint = 0
+
+    def delta(self, rec):
+        removed = set(rec.get("remove", ()))
+        for i in removed:
+            self.rows.pop(i, None)
+        self.ids = {k: i for k, i in self.ids.items() if i not in removed}
+
+        new_ids = []
+        for i, row in rec.get("upsert", ()):
+            if i not in self.rows:
+                new_ids.append(i)
+            self.rows[i] = row
+        self.order = rec["order"] if rec.get("order") is not None else (
+            [i for i in self.order if i not in removed] + new_ids)
+
+        # a new session's key depends on its position among duplicates, so
+        # it is derived from the final order, exactly as make_delta() did
+        if new_ids:
+            fresh = set(new_ids)
+            keys = _keyed(self.rows[i] for i in self.order)
+            for (key, _), i in zip(keys, self.order):
+                if i in fresh:
+                    self.ids[key] = i
+
+        for field, values in rec.get("volatile", {}).items():
+            for i, value in zip(self.order, values):
+                if field in self.rows[i]:
+                    self.rows[i][field] = value
+
+        self.at = rec["at"]
+        self.since_checkpoint += 1
+
+    def to_rows(self):
+        return [self.rows[i] for i in self.order]
+
+
+def replay(path, until=None):
+    """Snapshot after the last record with ``at <= until`` (or the last one)."""
+    snap = Snapshot()
+    if not Path(path).exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            if until is not None and rec["at"] > until:
+                break
+            if rec["kind"] == "checkpoint":
+                snap.checkpoint(rec)
+            else:
+                snap.delta(rec)
+    return snap if snap.at is not None else None
+
+
+# ---------------------------------------------------------------------------
+# Record
+# ---------------------------------------------------------------------------
+
+def make_delta(prev, rows, at):
+    """Delta record turning ``prev`` (a Snapshot) into ``rows``."""
+    keyed = _keyed(rows)
+    next_id = max(prev.rows, default=-1) + 1
+
+    upsert, order, new_ids = [], [], []
+    for key, row in keyed:
+        i = prev.ids.get(key)
+        if i is None:
+            i = next_id
+            next_id += 1
+            upsert.append([i, row])
+            new_ids.append(i)
+        elif _stable(prev.rows[i]) != _stable(row):
+            upsert.append([i, row])
+        order.append(i)
+
+    present = set(order)
+    remove = [i for i in prev.order if i not in present]
+    default_order = [i for i in prev.order if i in present] + new_ids
+
+    rec = {"kind": "delta", "at": at, "upsert": upsert, "remove": remove,
+           "order": None if order == default_order else order}
+    for field in VOLATILE:
+        values = [row.get(field) for row in rows]
+        # all-None still has to be written if the old rows had values,
+        # or the replay would keep them
+        if (any(v is not None for v in values)
+                or any(r.get(field) is not None for r in prev.rows.values())):
+            rec.setdefault("volatile", {})[field] = values
+    return rec
+
+
+def record(folder, shard, at=None):
+    """
+    Append the current detailed<shard>.json to its log.  Returns the kind
+    of record written, or None when nothing changed.
+    """
+    folder = Path(folder)
+    source = folder / f"detailed{shard}.json"
+    if not source.exists():
+        return None
+    rows = ds.load_rows(source)
+    at = at or now_ist()
+    path = log_path(folder, shard)
+    prev = replay(path)
+
+    if prev is None or prev.since_checkpoint + 1 >= CHECKPOINT_EVERY:
+        rec = {"kind": "checkpoint", "at": at, "rows": rows}
+    else:
+        rec = make_delta(prev, rows, at)
+        if (not rec["upsert"] and not rec["remove"] and rec["order"] is None
+                and all(a.get(k) == b.get(k) for a, b in zip(prev.to_rows(), rows)
+                        for k in VOLATILE)):
+            return None
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")))
+        f.write("\n")
+    return rec["kind"]
+
+
+def restore(folder, shard, until=None):
+    """Rewrite detailed<shard>.json from its log; False if there is no log."""
+    snap = replay(log_path(folder, shard), until)
+    if snap is None:
+        return False
+    ds.write_json(Path(folder) / f"detailed{shard}.json", snap.to_rows())
+    return True
+
+
+def history(folder, shard):
+    """[(at, kind, shows, sold, gross)] for every run in the log."""
+    out = []
+    path = log_path(folder, shard)
+    if not path.exists():
+        return out
+    snap = Snapshot()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            if rec["kind"] == "checkpoint":
+                snap.checkpoint(rec)
+            else:
+                snap.delta(rec)
+            rows = snap.to_rows()
+            out.append((rec["at"], rec["kind"], len(rows),
+                        sum(int(r.get("sold") or 0) for r in rows),
+                        round(sum(float(r.get("gross") or 0) for r in rows), 2)))
+    return out
+
+
+def unarchived_days(data_dir, archive_dir, today=None):
+    """
+    Days with a delta log that the nightly archive still needs: yesterday
+    (IST), whose log grew until midnight, and any day whose archive is
+    missing or lacks one of the shards that have a log.  Older days get no
+    more runs, so once archived they never need replaying again.
+    """
+    # show_archive needs zstandard, which only the cleanup job installs
+    import show_archive
+
+    today = datetime.strptime(today or ds.today_ist(), "%Y%m%d")
+    yesterday = (today - timedelta(days=1)).strftime("%Y%m%d")
+    days = []
+    for logs in sorted(Path(data_dir).glob("*/deltas")):
+        date = logs.parent.name
+        if date >= today.strftime("%Y%m%d"):
+            continue
+        target = show_archive.archive_path(date, archive_dir)
+        if date != yesterday and target.exists():
+            with show_archive.Archive(target) as arc:
+                archived = set(arc.latest())
+            if all(p.name[:-1] in archived for p in logs.glob("detailed*.jsonl")):
+                continue
+        days.append(date)
+    return days
+
+
+# ---------------------------------------------------------------------------
+
+def _until(date, at):
+    """'18:30' or a full ISO timestamp -> comparable ISO string."""
+    if at is None:
+        return None
+    if "T" in at:
+        return at
+    d = datetime.strptime(f"{date} {at}", "%Y%m%d %H:%M")
+    return ds.IST.localize(d).isoformat(timespec="seconds")
+
+
+def run_command(args, folder, date, shards):
+    ok = True
+    for shard in shards:
+        if args.command == "record":
+            kind = record(folder, shard)
+            print(f"detailed{shard}: {kind or 'unchanged'}")
+        elif args.command == "restore":
+            done = restore(folder, shard, _until(date, args.at))
+            print(f"detailed{shard}: {'restored' if done else 'no log, left as is'}")
+        elif args.command == "check":
+            snap = replay(log_path(folder, shard))
+            source = folder / f"detailed{shard}.json"
+            if snap is None or not source.exists():
+                print(f"detailed{shard}: nothing to check")
+                continue
+            same = ds.dump_bytes(snap.to_rows()) == source.read_bytes()
+            ok &= same
+            print(f"detailed{shard}: {'OK' if same else 'MISMATCH'}")
+        else:
+            prev_sold = None
+            print(f"detailed{shard}")
+            for at, kind, shows, sold, gross in history(folder, shard):
+                step = "" if prev_sold is None else f"{sold - prev_sold:+}"
+                print(f"  {at}  {kind:<10} {shows:>6} shows {sold:>8} sold "
+                      f"{step:>7} {gross:>14,.2f}")
+                prev_sold = sold
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["record", "restore", "check", "history"])
+    parser.add_argument("--shard", type=int)
+    parser.add_argument("--all", action="store_true", help="every shard 1..9")
+    parser.add_argument("--date", help="YYYYMMDD (default: today IST; pass the "
+                                       "run's date so a run past midnight stays put)")
+    parser.add_argument("--all-days", action="store_true",
+                        help="every day folder that has a delta log")
+    parser.add_argument("--unarchived", action="store_true",
+                        help="yesterday and every older day with a delta log "
+                             "that the archive does not hold yet")
+    parser.add_argument("--at", help="restore: HH:MM (IST) or ISO timestamp")
+    parser.add_argument("--data-dir", default=str(ds.DATA_DIR))
+    parser.add_argument("--archive-dir", default=str(Path("daily") / "archive"),
+                        help="for --unarchived")
+    args = parser.parse_args(argv)
+
+    if args.all:
+        shards = list(range(1, ds.SHARD_COUNT + 1))
+    elif args.shard:
+        shards = [args.shard]
+    else:
+        parser.error("--shard N or --all is required")
+
+    if args.all_days:
+        dates = sorted(p.parent.name for p in Path(args.data_dir).glob("*/deltas"))
+    elif args.unarchived:
+        dates = unarchived_days(args.data_dir, args.archive_dir)
+    else:
+        dates = [args.date or ds.today_ist()]
+    ok = True
+    for date in dates:
+        if len(dates) > 1:
+            print(date)
+        ok &= run_command(args, ds.day_dir(date, args.data_dir), date, shards)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import asyncio
+import socket
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+import fetch_pool as fp
+
+URL = "https://in.bookmyshow.com/api/venue?date=20260212&code=V0001"
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def with_server(test, **app_kw):
+    app = fp.make_app(**app_kw)
+    runner, base = await fp._start(app)
+    try:
+        return await test(app["state"], base)
+    finally:
+        await runner.cleanup()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_retries_then_returns_last_response():
+    async def test(state, base):
+        async with fp.FetchPool(redirect=base, retries=2, backoff=0.01) as pool:
+            resp = await pool.get(URL)
+        assert resp.status == 503
+        assert pool.stats["attempts"] == 3 and pool.stats["retries"] == 2
+        assert state["failed"] == 3
+
+    run(with_server(test, latency_ms=1, error_rate=1.0))
+
+
+def test_no_sleep_after_the_last_failed_attempt():
+    delays = []
+
+    class Pool(fp.FetchPool):
+        def _delay(self, attempt, retry_after=None):
+            delays.append(attempt)
+            return 0
+
+    async def test():
+        # nothing listens there: every attempt is a connection error
+        async with Pool(redirect=f"http://127.0.0.1:{free_port()}", retries=3) as pool:
+            with pytest.raises(fp.aiohttp.ClientError):
+                await pool.get(URL)
+        assert pool.stats["attempts"] == 4
+        assert delays == [0, 1, 2]
+
+    run(test())
+
+
+def test_concurrent_requests_share_one_fetch():
+    async def test(state, base):
+        async with fp.FetchPool(redirect=base) as pool:
+            # same URL, query in another order
+            other = "https://IN.bookmyshow.com/api/venue?code=V0001&date=20260212"
+            results = await asyncio.gather(*(pool.get(u) for u in [URL, other] * 3))
+            again = await pool.get(URL)
+        assert state["served"] == 1
+        assert pool.stats["coalesced"] == 5 and pool.stats["memo_hits"] == 1
+        assert all(r is results[0] for r in results + [again])
+
+    run(with_server(test, latency_ms=50))
+
+
+def test_cancelled_caller_leaves_the_fetch_to_the_others():
+    async def test(state, base):
+        async with fp.FetchPool(redirect=base) as pool:
+            first = asyncio.ensure_future(pool.get(URL))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.ensure_future(pool.get(URL))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            resp = await waiter
+        assert first.cancelled()
+        assert resp.ok and state["served"] == 1
+
+    run(with_server(test, latency_ms=100))
+
+
+def test_record_then_replay(tmp_path):
+    cassette = tmp_path / "requests.jsonl"
+
+    async def record(state, base):
+        async with fp.FetchPool(mode="record", cassette=cassette, redirect=base) as pool:
+            return await pool.get(URL)
+
+    live = run(with_server(record, latency_ms=1))
+    assert cassette.exists()
+
+    async def replay():
+        async with fp.FetchPool(mode="replay", cassette=cassette) as pool:
+            resp = await pool.get(URL)
+            with pytest.raises(fp.ReplayMiss):
+                await pool.get(URL.replace("V0001", "V0002"))
+        return resp
+
+    resp = run(replay())
+    assert resp.source == "replay"
+    assert (resp.status, resp.body) == (live.status, live.body)
+    assert resp.json()["key"] == fp.request_key(URL)
+
+
+def test_live_request_keeps_the_callers_query():
+    async def test(state, base):
+        async with fp.FetchPool(redirect=base) as pool:
+            await pool.get("https://in.bookmyshow.com/api/x?codes=A,B&q=a b&e=ET|1",
+                           params={"z": "1"})
+        # the caller's order and commas, not the sorted coalescing key
+        path, _, query = state["last_path"].partition("?")
+        assert path == "/api/x"
+        assert [kv.split("=")[0] for kv in query.split("&")] == ["codes", "q", "e", "z"]
+        assert query.startswith("codes=A,B&")
+
+    run(with_server(test, latency_ms=1))
+
+
+def test_unexpected_error_gives_the_slot_back():
+    async def test(state, base):
+        async with fp.FetchPool(redirect=base, fixed_limit=1, retries=0) as pool:
+            with pytest.raises(TypeError):
+                await pool.get(URL, params={"q": None})
+            resp = await asyncio.wait_for(pool.get(URL), 5)
+        assert resp.status == 200
+        assert pool.limiter("in.bookmyshow.com").in_flight == 0
+
+    run(with_server(test, latency_ms=1))
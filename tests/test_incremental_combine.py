@@ -0,0 +1,95 @@
+import daily_summary as ds
+import incremental_combine as ic
+
+
+def show(venue, city, language, sold, sid):
+    return {"source": "BMS", "movie": "M", "venue": venue, "city": city,
+            "state": "S", "language": language, "dimension": "2D",
+            "session_id": sid, "time": "10:00 AM", "sold": sold,
+            "totalSeats": 100, "gross": sold * 150.0}
+
+
+def details(summary):
+    m = summary["movies"]["M"]
+    return ([d["city"] for d in m["City_details"]],
+            [d["language"] for d in m["Language_details"]])
+
+
+def test_detail_order_is_first_appearance_after_city_venue_sort():
+    rows = [show("B", "pune", "Hindi", 1, "1"), show("A", "Pune", "Tamil", 1, "2"),
+            show("Z", "agra", "Hindi", 1, "3")]
+    summary = ds.Aggregate().add_rows(rows).summary("t")
+    # Agra sorts first; in Pune venue A (Tamil) comes before venue B
+    assert details(summary) == (["Agra", "Pune"], ["HINDI", "TAMIL"])
+
+
+def test_incremental_order_matches_full_after_removals(tmp_path):
+    first = [
+        [show("A", "Agra", "Tamil", 5, "1"), show("B", "Agra", "Hindi", 5, "2")],
+        [show("C", "Bhopal", "Hindi", 5, "3")],
+    ]
+    # venue A (Tamil) moved to shard 2, its old place in shard 1 is gone
+    second = [
+        [show("B", "Agra", "Hindi", 6, "2"), show("D", "Agra", "Tamil", 1, "4")],
+        [show("A", "Agra", "Tamil", 2, "5"), show("C", "Bhopal", "Hindi", 5, "3")],
+    ]
+    paths = [tmp_path / "detailed1.json", tmp_path / "detailed2.json"]
+    for snapshot in (first, second):
+        for p, rows in zip(paths, snapshot):
+            ds.write_json(p, rows)
+        summary, _ = ic.combine_incremental(tmp_path, "t", paths)
+        assert ds.dump_bytes(summary) == ds.dump_bytes(ds.build_summary(paths, "t"))
+    assert details(summary) == (["Agra", "Bhopal"], ["TAMIL", "HINDI"])
+
+    # dropping a shard takes its places with it
+    paths[1].unlink()
+    summary, _ = ic.combine_incremental(tmp_path, "t", paths[:1])
+    assert ds.dump_bytes(summary) == ds.dump_bytes(ds.build_summary(paths[:1], "t"))
+    assert details(summary) == (["Agra"], ["HINDI", "TAMIL"])
+
+
+def test_streamed_diff_survives_moves_past_the_window(tmp_path, monkeypatch):
+    monkeypatch.setattr(ic, "WINDOW", 2)
+    rows = [show(f"V{i}", f"C{i % 3}", "Hindi", i, str(i)) for i in range(20)]
+    rows.append(dict(rows[4]))                  # a repeated session key
+    path = tmp_path / "detailed1.json"
+    ds.write_json(path, rows)
+    _, stats = ic.combine_incremental(tmp_path, "t", [path])
+    assert stats["added"] == len(rows)
+
+    # the last shows move to the front, one changes, one is gone
+    moved = rows[15:] + rows[:15]
+    moved[3] = dict(moved[3], sold=99)
+    del moved[10]
+    ds.write_json(path, moved)
+    summary, stats = ic.combine_incremental(tmp_path, "t", [path])
+    assert ds.dump_bytes(summary) == ds.dump_bytes(ds.build_summary([path], "t"))
+    assert stats["removed"] - stats["added"] == 1
+    assert [k for k, _ in ic.iter_sessions(tmp_path, path.name)] == \
+        [ds.session_key(r) for r in moved]
+
+
+def test_detailed_out_is_rewritten_only_when_a_shard_changed(tmp_path):
+    shards = [[show("A", "Agra", "Hindi", 5, "1")], [], [show("C", "Pune", "Tamil", 2, "3")]]
+    paths = [tmp_path / f"detailed{n}.json" for n in (1, 2, 3)]
+    for p, rows in zip(paths, shards):
+        ds.write_json(p, rows)
+    out = tmp_path / "finaldetailed.json"
+    expected = ds.dump_bytes({"last_updated": "t1", "data": shards[0] + shards[2]})
+
+    ic.combine_incremental(tmp_path, "t1", paths, detailed_out=out)
+    assert out.read_bytes() == expected
+    ic.combine_incremental(tmp_path, "t2", paths, detailed_out=out)
+    assert out.read_bytes() == expected
+
+    ic.combine_full(tmp_path, "t1", paths, detailed_out=out)
+    assert out.read_bytes() == expected
+    ds.write_json(paths[1], [show("B", "Agra", "Hindi", 1, "2")])
+    ic.combine_incremental(tmp_path, "t3", paths, detailed_out=out)
+    assert out.read_bytes() == ds.dump_bytes(
+        {"last_updated": "t3", "data": [r for p in paths for r in ds.load_rows(p)]})
+
+    # a day with no shows yet
+    with ic.DetailedWriter(out, "t4"):
+        pass
+    assert out.read_bytes() == ds.dump_bytes({"last_updated": "t4", "data": []})
@@ -0,0 +1,62 @@
+import io
+import json
+
+import pytest
+
+from json_stream import ArrayWriter, iter_array
+
+ROWS = [
+    {"movie": "Ünïcode \"quoted\" \\ title", "sold": 12, "gross": 1234.5,
+     "minutes_left": None, "tags": ["a", {"b": [1, 2.0, True]}]},
+    {"movie": "x" * 300, "sold": -3, "gross": 1e-7, "minutes_left": 1234567890123},
+    {},
+    {"movie": "", "sold": 0},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 16])
+def test_iter_array_matches_json_load(chunk_size):
+    text = json.dumps(ROWS * 5, indent=2, ensure_ascii=False)
+    assert list(iter_array(io.StringIO(text), chunk_size=chunk_size)) == ROWS * 5
+
+
+def test_wrapped_array():
+    text = json.dumps({"last_updated": "x", "data": ROWS}, indent=2)
+    assert list(iter_array(io.StringIO(text), key="data", chunk_size=5)) == ROWS
+
+
+def test_array_writer_bytes():
+    out = io.StringIO()
+    with ArrayWriter(out) as w:
+        for row in ROWS:
+            w.write(row)
+    assert out.getvalue() == json.dumps(ROWS, indent=2, ensure_ascii=False)
+
+
+class CountingReader(io.StringIO):
+    def __init__(self, text):
+        super().__init__(text)
+        self.read_chars = 0
+
+    def read(self, n=-1):
+        data = super().read(n)
+        self.read_chars += len(data)
+        return data
+
+
+def test_malformed_item_fails_without_reading_the_rest():
+    good = json.dumps({"movie": "ok", "sold": 1})
+    tail = ",\n".join([good] * 50000)           # a few MB after the error
+    fp = CountingReader('[{"movie": "bad" "sold": 1},\n' + tail + "]")
+    rows = iter_array(fp, chunk_size=256)
+    with pytest.raises(json.JSONDecodeError):
+        next(rows)
+    assert fp.read_chars <= 1024
+
+
+def test_item_growth_is_bounded():
+    # an unterminated string keeps looking truncated; stop at one item's size
+    fp = CountingReader('[{"movie": "' + "x" * 100000 + "]")
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_array(fp, chunk_size=256, max_item=4096))
+    assert fp.read_chars <= 4096 + 512
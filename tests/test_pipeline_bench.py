@@ -0,0 +1,55 @@
+import json
+
+import pipeline_bench as pb
+
+
+def report(python="3.12.1", calibration=0.1, **steps):
+    """One fixture; ``steps``: name -> seconds, relative = seconds / calibration."""
+    return {"python": python, "fixtures": {"20260212": {"steps": {
+        name: {"seconds": s, "relative": s / calibration, "calibration_s": calibration}
+        for name, s in steps.items()}}}}
+
+
+def test_compare_uses_calibration_relative_times():
+    base = report(parse=1.0, aggregate=0.5, archive=0.01)
+    # twice as slow on a machine that is twice as slow: no change
+    same = pb.compare(report(calibration=0.2, parse=2.0, aggregate=1.0, archive=0.02),
+                      base, 0.25, 0.02)
+    assert [(k, round(c, 6), r) for k, _, _, c, r in same] == [
+        ("20260212/parse", 0.0, False), ("20260212/aggregate", 0.0, False),
+        ("20260212/archive", 0.0, False)]
+
+    # same machine: parse 30% slower regresses, archive is too small to
+    # count, aggregate is within the threshold
+    slower = pb.compare(report(parse=1.3, aggregate=0.6, archive=0.02), base, 0.25, 0.02)
+    assert {k: r for k, _, _, _, r in slower} == {
+        "20260212/parse": True, "20260212/aggregate": False, "20260212/archive": False}
+
+
+def test_steps_missing_from_the_baseline_are_listed():
+    base = report(parse=1.0)
+    cur = report(parse=1.0, aggregate=0.5, combine_script=2.0)
+    assert [k for k, *_ in pb.compare(cur, base, 0.25, 0.02)] == ["20260212/parse"]
+    assert pb.ungated(cur, base) == ["aggregate", "combine_script"]
+
+
+def run_main(tmp_path, monkeypatch, baseline, current):
+    path = tmp_path / "baseline.json"
+    path.write_text(json.dumps(baseline))
+    monkeypatch.setattr(pb, "run", lambda *a, **kw: current)
+    return pb.main(["--baseline", str(path), "--out", str(tmp_path / "latest.json")])
+
+
+def test_regressions_fail_only_against_a_same_python_baseline(tmp_path, monkeypatch):
+    base = report(parse=1.0)
+    slow = report(parse=2.0)
+    assert run_main(tmp_path, monkeypatch, base, slow) == 1
+    assert run_main(tmp_path, monkeypatch, report("3.11.7", parse=1.0), slow) == 0
+    assert run_main(tmp_path, monkeypatch, base, report(parse=1.1)) == 0
+
+
+def test_no_baseline_reports_without_gating(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(pb, "run", lambda *a, **kw: report(parse=9.0))
+    assert pb.main(["--baseline", str(tmp_path / "none.json"),
+                    "--out", str(tmp_path / "latest.json")]) == 0
+    assert "No baseline" in capsys.readouterr().out
@@ -0,0 +1,112 @@
+import json
+
+import plan_shards as ps
+
+
+def venue(code, city):
+    return {"VenueCode": code, "VenueName": f"Cinema {code}: {city}",
+            "VenueAddress": f"Main Road, {city}", "City": city}
+
+
+def show(v, sid):
+    return {"source": "BMS", "venue": v["VenueName"], "address": v["VenueAddress"],
+            "movie": "M", "session_id": f"{v['VenueCode']}-{sid}"}
+
+
+def write_json(path, obj, newline="\n"):
+    text = json.dumps(obj, indent=2, ensure_ascii=False)
+    path.write_bytes(text.replace("\n", newline).encode("utf-8"))
+
+
+def fixture(tmp_path):
+    # shard 1 gets every busy venue, so the first plan has to move some
+    venues = [venue(f"V{i:02d}", f"Town{i}") for i in range(12)]
+    shards = {1: venues[:6], 2: venues[6:9], 3: venues[9:]}
+    for n, vs in shards.items():
+        write_json(tmp_path / f"venues{n}.json", {v["VenueCode"]: v for v in vs}, "\r\n")
+    for n in (*shards, ps.DISTRICT_SHARD):
+        (tmp_path / f"bmsdaily{n}.py").write_text("")
+    day = tmp_path / "data" / "20260212"
+    day.mkdir(parents=True)
+    for n, vs in shards.items():
+        rows = [show(v, s) for i, v in enumerate(vs) for s in range(12 - i if n == 1 else 1)]
+        write_json(day / f"detailed{n}.json", rows)
+    return tmp_path
+
+
+def snapshot(root):
+    return {p.name: p.read_bytes() for p in sorted(root.glob("venues*.json"))}
+
+
+def test_second_write_changes_nothing(tmp_path):
+    root = fixture(tmp_path)
+    args = ["--shards", "3", "--data-dir", str(root / "data"),
+            "--venues-dir", str(root), "--holdout", "0", "--write"]
+    before = snapshot(root)
+    assert ps.main(args) == 0
+    first = snapshot(root)
+    assert first != before
+    assert all(b"\r\n" in text for text in first.values())
+
+    assert ps.main(args) == 0
+    assert snapshot(root) == first
+
+
+def test_lookup_ignores_current_split(tmp_path):
+    root = fixture(tmp_path)
+    index = ps.VenueIndex(ps.load_venue_files(root, 3))
+    days = list(ps.history_days(root / "data", 3))
+    costs, unmatched = ps.venue_costs(index, days)
+
+    # same rows, venues split differently: every venue keeps its cost
+    moved = ps.plan(costs, 3, index.shard_of, target=1.0)
+    ps.write_plan(ps.load_venue_files(root, 3), moved, 3, root)
+    index = ps.VenueIndex(ps.load_venue_files(root, 3))
+    assert ps.venue_costs(index, days) == (costs, unmatched)
+    assert unmatched == 0
+
+
+def test_plan_keeps_split_under_target():
+    costs = {"A": 5.0, "B": 4.0, "C": 3.0, "D": 3.0}
+    current = {"A": 1, "D": 1, "B": 2, "C": 2}
+    assert ps.plan(costs, 2, current, target=1.2) == current
+    lpt = ps.plan(costs, 2)
+    assert ps.skew(ps.shard_loads(lpt, costs, 2)) <= 1.2
+
+
+def test_write_refuses_shards_no_scraper_reads(tmp_path, capsys):
+    root = fixture(tmp_path)
+    before = snapshot(root)
+    for count in (2, 4):
+        try:
+            ps.main(["--shards", str(count), "--data-dir", str(root / "data"),
+                     "--venues-dir", str(root), "--write"])
+        except SystemExit as e:
+            assert e.code == 2
+        else:
+            raise AssertionError("--write accepted a shard count without scrapers")
+        assert "bmsdaily1..%d.py" % count in capsys.readouterr().err
+    assert snapshot(root) == before
+
+
+def split(root):
+    return {n: set(v) for n, v in ps.load_venue_files(root, 3).items()}
+
+
+def test_from_scratch_gives_one_split_from_any_start(tmp_path):
+    root = fixture(tmp_path)
+    args = ["--shards", "3", "--data-dir", str(root / "data"),
+            "--venues-dir", str(root), "--holdout", "0", "--from-scratch", "--write"]
+    assert ps.main(args) == 0
+    first = split(root)
+
+    # start from another split of the same venues
+    shards = ps.load_venue_files(root, 3)
+    ps.write_plan(shards, {code: n % 3 + 1 for n, vs in shards.items() for code in vs},
+                  3, root)
+    assert split(root) != first
+    assert ps.main(args) == 0
+    assert split(root) == first
+    # and the stable re-plan leaves it alone
+    assert ps.main(args[:-2] + ["--write"]) == 0
+    assert split(root) == first
@@ -0,0 +1,46 @@
+import json
+
+import run_index as ri
+
+
+def test_changes_are_against_the_previous_calendar_day():
+    entries = [["20260206", 10, 500.0, 5, 100, 5.0],
+               ["20260201", 10, 100.0, 1, 100, 1.0],
+               ["20260207", 10, 800.0, 9, 100, 9.0],
+               ["20260131", 10, 50.0, 1, 100, 1.0]]
+    rows = [dict(zip(ri.FIELDS, e)) for e in ri.with_running(entries)]
+    assert [r["date"] for r in rows] == ["20260131", "20260201", "20260206", "20260207"]
+    # across the month end, then a gap of four days
+    assert [r["gross_change"] for r in rows] == [None, 50.0, None, 300.0]
+    assert [r["sold_change"] for r in rows] == [None, 0, None, 4]
+    assert rows[-1]["gross_total"] == 1450.0
+
+
+def _summary(folder, gross):
+    folder.mkdir(parents=True, exist_ok=True)
+    city = {"city": "Pune", "state": "MH", "shows": 2, "gross": gross, "sold": 3,
+            "totalSeats": 100, "occupancy": 3.0}
+    movie = {k: v for k, v in city.items() if k not in ("city", "state")}
+    movie["City_details"] = [city]
+    (folder / "finalsummary.json").write_text(json.dumps({"movies": {"M": movie}}))
+
+
+def test_build_before_leaves_the_open_day_alone(tmp_path):
+    data, root = tmp_path / "data", tmp_path / "index"
+    _summary(data / "20260211", 100.0)
+    _summary(data / "20260212", 50.0)
+    index = ri.RunIndex(root)
+    assert index.update(data, before="20260212") == ["20260211"]
+    movie_file = next((root / "movies").glob("*.json"))
+    written = movie_file.read_bytes()
+
+    # today's summary changes on every combine: nothing is rewritten
+    _summary(data / "20260212", 80.0)
+    assert ri.RunIndex(root).update(data, before="20260212") == []
+    assert movie_file.read_bytes() == written
+
+    # once the day is closed it is folded in
+    assert ri.RunIndex(root).update(data, before="20260213") == ["20260212"]
+    rows = ri.RunIndex(root).movie_series("M")
+    assert [(r["date"], r["gross_change"]) for r in rows] == [
+        ("20260211", None), ("20260212", -20.0)]
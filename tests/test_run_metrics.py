@@ -0,0 +1,90 @@
+import json
+
+import run_metrics as rm
+
+JOB = """
+import json, os, sys
+with open(sys.argv[1], "w") as f:
+    json.dump([{"i": i} for i in range(40)], f)
+with open(sys.argv[1]) as f:
+    json.load(f)
+with open(os.environ["FETCH_METRICS"], "a") as f:
+    f.write(json.dumps({"requests": 7, "retries": 1, "busy_s": 0.5, "p95_ms": 12.0}) + "\\n")
+sys.exit(int(sys.argv[2]))
+"""
+
+
+def run(tmp_path, code):
+    script = tmp_path / "job.py"
+    script.write_text(JOB)
+    day = tmp_path / "data" / "20260212"
+    day.mkdir(parents=True, exist_ok=True)
+    ret = rm.run_script("job", str(script), [str(day / "detailed1.json"), str(code)],
+                        "20260212", ["detailed1.json"], tmp_path / "data")
+    [path] = (day / "metrics").glob("job-*.json")
+    with open(path, encoding="utf-8") as f:
+        return ret, json.load(f)
+
+
+def test_child_is_measured_from_outside(tmp_path):
+    ret, m = run(tmp_path, 0)
+    assert ret == 0 and m["status"] == "ok"
+    assert m["records"] == 40
+    assert m["outputs"]["detailed1.json"]["records"] == 40
+    assert m["network"]["requests"] == 7 and m["network"]["p95_ms"] == 12.0
+    assert m["peak_rss_mb"] > 0
+    if m["bytes_written"] is not None:       # /proc available
+        assert m["bytes_written"] >= m["outputs"]["detailed1.json"]["bytes"]
+
+
+def test_stages_are_timed_inside_the_child(tmp_path):
+    _, m = run(tmp_path, 0)
+    size = m["outputs"]["detailed1.json"]["bytes"]
+    write, parse = m["stages"]["write"], m["stages"]["parse"]
+    assert write["calls"] >= 1 and write["records"] >= 40 and write["bytes"] >= size
+    assert parse["calls"] >= 1 and parse["bytes"] >= size
+
+
+def test_exit_code_is_passed_through(tmp_path):
+    ret, m = run(tmp_path, 3)
+    assert ret == 3
+    assert m["status"] == "failed" and m["exit_code"] == 3
+
+
+def test_metrics_failures_keep_the_exit_code(tmp_path, monkeypatch):
+    script = tmp_path / "job.py"
+    script.write_text("import sys\nopen(sys.argv[1], 'w').write('[{\"i\": 1}, {')\n")
+    day = tmp_path / "data" / "20260212"
+    day.mkdir(parents=True)
+    out = day / "detailed1.json"
+    # truncated output file: recorded, not counted
+    assert rm.run_script("job", str(script), [str(out)], "20260212",
+                         ["detailed1.json"], tmp_path / "data") == 0
+    [path] = (day / "metrics").glob("job-*.json")
+    with open(path, encoding="utf-8") as f:
+        assert "error" in json.load(f)["outputs"]["detailed1.json"]
+
+    def broken(*a, **kw):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(rm.RunMetrics, "write", broken)
+    assert rm.run_script("job", str(script), [str(out)], "20260212",
+                         ["detailed1.json"], tmp_path / "data") == 0
+
+
+def test_inputs_are_the_records_when_given(tmp_path):
+    script = tmp_path / "combine.py"
+    script.write_text("import json, sys\njson.dump({'movies': {'M': 1}}, open(sys.argv[1], 'w'))\n")
+    day = tmp_path / "data" / "20260212"
+    day.mkdir(parents=True)
+    for n, count in ((1, 30), (2, 12)):
+        (day / f"detailed{n}.json").write_text(json.dumps([{"i": i} for i in range(count)]))
+    (day / "finaldetailed.json").write_text(json.dumps({"last_updated": "t", "data": [{}]}))
+    assert rm.run_script("combine", str(script), [str(day / "finalsummary.json")], "20260212",
+                         ["finalsummary.json"], tmp_path / "data", ["detailed*.json"]) == 0
+    [path] = (day / "metrics").glob("combine-*.json")
+    with open(path, encoding="utf-8") as f:
+        m = json.load(f)
+    assert m["records"] == 42
+    assert m["outputs"]["finalsummary.json"]["records"] == 1
+    assert sorted(m["inputs"]) == ["detailed1.json", "detailed2.json"]
@@ -0,0 +1,93 @@
+import pytest
+
+pytest.importorskip("zstandard")
+
+import daily_summary as ds
+import show_archive as sa
+
+
+def _round_trip(tmp_path, rows, last_updated=None):
+    path = tmp_path / "day.zcol"
+    sa.append_segment(path, "detailed1.json", rows, last_updated)
+    with sa.Archive(path) as arc:
+        seg = arc.latest()["detailed1.json"]
+        return seg.to_rows(), seg.last_updated
+
+
+def test_mixed_type_and_null_columns(tmp_path):
+    rows = [
+        {"a": "x", "c": None, "d": 1.5, "e": True},
+        {"a": 5, "c": 3, "d": 2, "e": None},
+        {"a": 2.25, "c": "7", "e": [1, "two"]},
+        {"c": None, "a": None, "d": 0},
+    ]
+    back, _ = _round_trip(tmp_path, rows)
+    assert back == rows
+    # types, not only values: 5 must not come back as "5" or 5.0
+    assert [type(r.get("a")) for r in back] == [str, int, float, type(None)]
+    assert [type(r.get("c")) for r in back] == [type(None), int, str, type(None)]
+    assert isinstance(back[1]["d"], int) and isinstance(back[0]["d"], float)
+    assert [list(r) for r in back] == [list(r) for r in rows]
+    assert ds.dump_bytes(back) == ds.dump_bytes(rows)
+
+
+def test_numbers_a_typed_column_cannot_hold(tmp_path):
+    rows = [
+        {"big": 2 ** 70, "mixed": 2 ** 53 + 1, "ok": 2 ** 63 - 1},
+        {"big": -5, "mixed": 0.5, "ok": -(2 ** 63)},
+    ]
+    back, _ = _round_trip(tmp_path, rows)
+    assert back == rows
+    assert back[0]["mixed"] == 2 ** 53 + 1 and isinstance(back[0]["mixed"], int)
+    with sa.Archive(tmp_path / "day.zcol") as arc:
+        kinds = {k: c["kind"] for k, c in arc.latest()["detailed1.json"].columns.items()}
+    assert kinds == {"big": "dict", "mixed": "dict", "ok": "q"}
+
+
+def test_nulls_keep_a_number_column_typed(tmp_path):
+    rows = [
+        {"sold": 5, "minutes_left": 120, "gross": 450.0},
+        {"sold": None, "minutes_left": None, "gross": 300},
+        {"sold": 7, "minutes_left": None, "gross": None},
+        {"sold": 0, "gross": 0.5},
+    ]
+    back, _ = _round_trip(tmp_path, rows)
+    assert ds.dump_bytes(back) == ds.dump_bytes(rows)
+    assert [type(r["gross"]) for r in back] == [float, int, type(None), float]
+    with sa.Archive(tmp_path / "day.zcol") as arc:
+        seg = arc.latest()["detailed1.json"]
+        kinds = {k: c["kind"] for k, c in seg.columns.items()}
+        assert seg.column("minutes_left").tolist() == [120, 0, 0, 0]
+    assert kinds == {"sold": "q", "minutes_left": "q", "gross": "d"}
+
+
+def test_string_that_looks_like_json_stays_a_string(tmp_path):
+    rows = [{"a": "5"}, {"a": 5}, {"a": "null"}, {"a": None}]
+    back, _ = _round_trip(tmp_path, rows)
+    assert back == rows
+    assert back[0]["a"] == "5" and back[2]["a"] == "null"
+
+
+def test_finaldetailed_keeps_last_updated(tmp_path):
+    folder = tmp_path / "data" / "20251231"
+    folder.mkdir(parents=True)
+    source = folder / "finaldetailed.json"
+    rows = [{"movie": "M", "sold": 3, "gross": 450.0, "minutes_left": None}]
+    ds.write_json(source, {"last_updated": "2025-12-31 23:01 IST", "data": rows})
+
+    archive_dir = tmp_path / "archive"
+    sa.convert_day(folder, archive_dir)
+    assert sa.check_day(folder, archive_dir)
+
+    out = tmp_path / "out"
+    sa.export_day("20251231", out, archive_dir)
+    assert (out / "finaldetailed.json").read_bytes() == source.read_bytes()
+
+    # a new last_updated alone is a new snapshot
+    ds.write_json(source, {"last_updated": "2026-01-01 00:10 IST", "data": rows})
+    assert not sa.check_day(folder, archive_dir)
+    sa.convert_day(folder, archive_dir)
+    assert sa.check_day(folder, archive_dir)
+    with sa.Archive(sa.archive_path("20251231", archive_dir)) as arc:
+        assert len(arc.segments) == 2
+        assert arc.latest()["finaldetailed.json"].last_updated == "2026-01-01 00:10 IST"
@@ -0,0 +1,54 @@
+import pytest
+
+import daily_summary as ds
+import snapshot_delta as sd
+
+
+def row(sid, sold, minutes_left):
+    return {"source": "BMS", "venue": "V", "movie": "M", "session_id": sid,
+            "time": "10:00 AM", "sold": sold, "minutes_left": minutes_left}
+
+
+def test_volatile_column_cleared_to_none(tmp_path):
+    source = tmp_path / "detailed1.json"
+    runs = [
+        [row("1", 5, 120), row("2", 0, 300)],
+        [row("1", 5, 90), row("2", 1, 270)],
+        [row("1", 5, None), row("2", 1, None)],      # shows started
+    ]
+    for i, rows in enumerate(runs):
+        ds.write_json(source, rows)
+        assert sd.record(tmp_path, 1, at=f"2026-02-12T1{i}:00:00+05:30")
+
+    snap = sd.replay(sd.log_path(tmp_path, 1))
+    assert snap.to_rows() == runs[-1]
+    assert sd.replay(sd.log_path(tmp_path, 1), "2026-02-12T11:00:00+05:30").to_rows() == runs[1]
+
+
+def test_all_none_column_is_not_written_twice(tmp_path):
+    prev = sd.Snapshot()
+    prev.checkpoint({"at": "t0", "rows": [row("1", 5, None)]})
+    rec = sd.make_delta(prev, [row("1", 6, None)], "t1")
+    assert "volatile" not in rec
+
+
+def test_unarchived_days(tmp_path):
+    pytest.importorskip("zstandard")
+    import show_archive
+
+    data, archive = tmp_path / "data", tmp_path / "archive"
+    for date in ("20260209", "20260210", "20260211", "20260212"):
+        folder = data / date
+        folder.mkdir(parents=True)
+        for shard in (1, 2):
+            ds.write_json(folder / f"detailed{shard}.json", [row("1", shard, 60)])
+            sd.record(folder, shard, at="2026-02-12T10:00:00+05:30")
+    # 09 is fully archived, 10 only holds shard 1, 11 has no archive yet
+    for date, shards in (("20260209", (1, 2)), ("20260210", (1,))):
+        for shard in shards:
+            show_archive.append_segment(show_archive.archive_path(date, archive),
+                                        f"detailed{shard}.json", [row("1", shard, 60)])
+
+    assert sd.unarchived_days(data, archive, today="20260212") == ["20260210", "20260211"]
+    # yesterday is replayed even when archived: its log grew until midnight
+    assert sd.unarchived_days(data, archive, today="20260210") == ["20260209"]
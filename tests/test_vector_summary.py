@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+import daily_summary as ds
+import vector_summary as vs
+
+
+def show(venue, city, language, sold, seats, gross=None, dimension="2D", state="MH"):
+    return {"movie": "M", "venue": venue, "city": city, "state": state,
+            "language": language, "dimension": dimension, "sold": sold,
+            "totalSeats": seats, "gross": sold * 120.5 if gross is None else gross}
+
+
+def both(rows):
+    py = ds.Aggregate().add_rows(rows).summary("t")
+    pd = vs.summarize(vs.prepare(vs.frame_from_rows(rows)), "t")
+    assert ds.dump_bytes(pd) == ds.dump_bytes(py)
+    return py["movies"]["M"]
+
+
+def test_thresholds_and_zero_seats():
+    m = both([
+        show("A", "Pune", "Hindi", 50, 100),     # exactly 50%: fastfilling
+        show("A", "Pune", "Hindi", 49, 100),
+        show("B", "Pune", "Hindi", 98, 100),     # exactly 98%: housefull
+        show("B", "Pune", "Hindi", 97, 100),
+        show("C", "Pune", "Hindi", 49, 98),      # 50% from a float ratio
+        show("C", "Pune", "Hindi", 49, 50),      # 98% from a float ratio
+        show("D", "Pune", "Hindi", 0, 0),        # no seat layout
+        show("D", "Pune", "Hindi", 3, 0),
+    ])
+    assert (m["fastfilling"], m["housefull"]) == (3, 2)
+    assert m["shows"] == 8 and m["venues"] == 4
+
+
+def test_missing_and_odd_case_values():
+    m = both([
+        show("A", "pUNE", "hindi", 5, 100),
+        show("B", "Pune", "HINDI", 5, 100),
+        show("C", None, None, 5, 100, dimension=None, state=None),
+        show("D", "", "", 1, 10),
+        {**show("E", "agra", "Tamil", 0, 0), "sold": None, "totalSeats": None,
+         "gross": None},
+    ])
+    assert [c["city"] for c in m["City_details"]].count("Pune") == 1
+    assert [lang["language"] for lang in m["Language_details"]].count("HINDI") == 1
+
+
+def test_detail_order_is_first_place():
+    m = both([
+        show("Z", "Pune", "Tamil", 1, 100, dimension="3D"),
+        show("B", "Agra", "Hindi", 1, 100, dimension="2D"),
+        show("A", "Pune", "Hindi", 1, 100, dimension="IMAX 2D"),
+        show("A", "Agra", "Telugu", 1, 100, dimension="3D"),
+    ])
+    # sorted by city, then venue: Agra/A, Agra/B, Pune/A, Pune/Z
+    assert [c["city"] for c in m["City_details"]] == ["Agra", "Pune"]
+    assert [d["language"] for d in m["Language_details"]] == ["TELUGU", "HINDI", "TAMIL"]
+    assert [d["dimension"] for d in m["Format_details"]] == ["3D", "2D", "IMAX 2D"]
@@ -0,0 +1,255 @@
+"""
+pandas backend for finalsummary.json.
+
+Loads all shard rows into one DataFrame, derives the per-show columns
+(categorical movie/city/state/language/dimension/venue, gross in paise,
+fastfilling/housefull flags) with vectorised ops, then computes the four
+breakdowns with one groupby each: movie, movie x city/state,
+movie x language and movie x dimension (distinct venues via nunique).
+Detail lists are ordered by the smallest "place" of their shows: the
+row's position once all rows are stably sorted by city and venue, as in
+daily_summary.py.
+
+The result is the same dict daily_summary.build_summary() returns, and is
+meant to be byte-identical once dumped; --bench checks that on every day
+in daily/data and times both aggregation paths on the same parsed rows.
+
+Usage:
+    python vector_summary.py --bench
+    python vector_summary.py --date 20260212      # write finalsummary.json
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import daily_summary as ds
+
+COLUMNS = ["movie", "city", "state", "language", "dimension", "venue",
+           "sold", "totalSeats", "gross"]
+
+METRICS = dict(
+    shows=("sold", "size"),
+    gross=("gross_paise", "sum"),
+    sold=("sold", "sum"),
+    totalSeats=("totalSeats", "sum"),
+    fastfilling=("fastfilling", "sum"),
+    housefull=("housefull", "sum"),
+    venues=("venue", "nunique"),
+)
+
+
+def frame_from_rows(rows):
+    return pd.DataFrame.from_records(rows, columns=COLUMNS)
+
+
+def load_frame(paths):
+    frames = [frame_from_rows(ds.load_rows(p)) for p in paths]
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _category(series, normalise=None):
+    """
+    Categorical copy of a string column, categories in sorted order so the
+    codes sort like the strings.  ``normalise`` runs once per distinct
+    value, not once per show.
+    """
+    series = series.fillna("").astype(str)
+    if normalise is not None:
+        series = series.map({v: normalise(v) for v in series.unique()})
+    return series.astype(pd.CategoricalDtype(sorted(series.unique())))
+
+
+def prepare(df):
+    """Per-show columns, mirroring daily_summary.contribution()."""
+    out = pd.DataFrame({
+        "movie": _category(df["movie"]),
+        "city": _category(df["city"], str.title),
+        "state": _category(df["state"], str.title),
+        "language": _category(df["language"], str.upper),
+        "dimension": _category(df["dimension"]),
+        "venue": _category(df["venue"]),
+        "sold": df["sold"].fillna(0).astype("int64"),
+        "totalSeats": df["totalSeats"].fillna(0).astype("int64"),
+    })
+    # numpy rounds half to even, like round() in contribution()
+    out["gross_paise"] = (df["gross"].fillna(0).astype("float64") * 100).round().astype("int64")
+
+    seats = out["totalSeats"]
+    occ = (out["sold"] / seats.where(seats != 0)) * 100
+    out["housefull"] = (occ >= ds.HOUSEFULL_MIN).astype("int64")
+    out["fastfilling"] = ((occ >= ds.FASTFILLING_MIN)
+                          & (occ < ds.HOUSEFULL_MIN)).astype("int64")
+
+    # lexsort is stable, so equal (city, venue) rows keep their file order
+    order = np.lexsort((out["venue"].cat.codes, out["city"].cat.codes))
+    place = np.empty(len(out), dtype="int64")
+    place[order] = np.arange(len(out))
+    out["place"] = place
+    return out
+
+
+def _block(r):
+    sold, seats = int(r.sold), int(r.totalSeats)
+    return {
+        "venues": int(r.venues),
+        "shows": int(r.shows),
+        "gross": round(int(r.gross) / 100, 2),
+        "sold": sold,
+        "totalSeats": seats,
+        "fastfilling": int(r.fastfilling),
+        "housefull": int(r.housefull),
+        "occupancy": round(sold / seats * 100, 2) if seats else 0.0,
+    }
+
+
+def _grouped(df, keys, **extra):
+    agg = dict(METRICS, **extra)
+    return df.groupby(keys, sort=False, observed=True).agg(**agg).reset_index()
+
+
+def summarize(df, last_updated):
+    if df.empty:
+        return {"last_updated": last_updated, "movies": {}}
+
+    movies = {}
+    for r in _grouped(df, ["movie"], cities=("city", "nunique")).itertuples(index=False):
+        b = _block(r)
+        movies[r.movie] = {
+            "shows": b["shows"], "gross": b["gross"], "sold": b["sold"],
+            "totalSeats": b["totalSeats"], "venues": b["venues"],
+            "cities": int(r.cities), "fastfilling": b["fastfilling"],
+            "housefull": b["housefull"], "occupancy": b["occupancy"],
+            "City_details": [], "Language_details": [], "Format_details": [],
+        }
+
+    cities = {}
+    first = ("place", "min")
+    for r in _grouped(df, ["movie", "city", "state"], first=first).itertuples(index=False):
+        cities.setdefault(r.movie, []).append(
+            (r.first, {"city": r.city, "state": r.state, **_block(r)}))
+    for name, rows in cities.items():
+        movies[name]["City_details"] = [b for _, b in sorted(rows, key=lambda x: x[0])]
+
+    for field, out_key in (("language", "Language_details"),
+                           ("dimension", "Format_details")):
+        groups = {}
+        for r in _grouped(df, ["movie", field], first=first).itertuples(index=False):
+            key = getattr(r, field)
+            groups.setdefault(r.movie, []).append(
+                (r.first, {field: key, **_block(r)}))
+        for name, rows in groups.items():
+            # same order as daily_summary._in_order: first show's place
+            movies[name][out_key] = [b for _, b in sorted(rows, key=lambda x: x[0])]
+
+    return {
+        "last_updated": last_updated,
+        "movies": {name: movies[name] for name in sorted(movies)},
+    }
+
+
+def build_summary(paths, last_updated=None):
+    return summarize(prepare(load_frame(paths)), last_updated or ds.now_ist_label())
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def _source_paths(folder):
+    paths = ds.shard_paths(folder)
+    if not paths and (Path(folder) / "finaldetailed.json").exists():
+        paths = [Path(folder) / "finaldetailed.json"]
+    return paths
+
+
+def _best(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench(data_dir=ds.DATA_DIR, repeat=3):
+    """
+    Per day: JSON parse time, then both aggregations over the same parsed
+    rows, and a byte diff of the two summaries.
+    """
+    ok = True
+    total_py = total_pd = 0.0
+    label = "bench"
+    for folder in sorted(p for p in Path(data_dir).iterdir() if p.is_dir()):
+        paths = _source_paths(folder)
+        parse_t, rows = _best(lambda: [r for p in paths for r in ds.load_rows(p)], 1)
+        if not rows:
+            continue
+
+        py_t, py_out = _best(
+            lambda: ds.Aggregate().add_rows(rows).summary(label), repeat)
+        pd_t, pd_out = _best(
+            lambda: summarize(prepare(frame_from_rows(rows)), label), repeat)
+
+        same = ds.dump_bytes(py_out) == ds.dump_bytes(pd_out)
+        ok &= same
+        total_py += py_t
+        total_pd += pd_t
+        blocks = sum(1 + len(m["City_details"]) + len(m["Language_details"])
+                     + len(m["Format_details"]) for m in py_out["movies"].values())
+        print(f"{folder.name}: {len(rows):>6} shows {blocks:>5} blocks | "
+              f"parse {parse_t * 1000:5.0f} ms | python {py_t * 1000:5.0f} ms  "
+              f"pandas {pd_t * 1000:5.0f} ms | {'identical' if same else 'DIFFERENT'}")
+        if not same:
+            _print_diff(py_out, pd_out)
+
+    if total_pd:
+        print(f"total aggregation: python {total_py:.2f}s  pandas {total_pd:.2f}s  "
+              f"({total_py / total_pd:.1f}x)")
+    return ok
+
+
+def _print_diff(a, b, limit=5):
+    shown = 0
+    for name in sorted(set(a["movies"]) | set(b["movies"])):
+        if a["movies"].get(name) != b["movies"].get(name):
+            print(f"   differs: {name!r}")
+            shown += 1
+            if shown >= limit:
+                return
+
+
+# ---------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--date", help="YYYYMMDD (default: today IST)")
+    parser.add_argument("--data-dir", default=str(ds.DATA_DIR))
+    parser.add_argument("--bench", action="store_true",
+                        help="time and diff against the pure-Python path on every day")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        return 0 if bench(args.data_dir) else 1
+
+    folder = ds.day_dir(args.date or ds.today_ist(), args.data_dir)
+    paths = ds.shard_paths(folder)
+    if not paths:
+        print(f"❌ No shard files in {folder}")
+        return 1
+    summary = build_summary(paths)
+    ds.write_json(folder / "finalsummary.json", summary)
+    print(f"✅ {len(summary['movies'])} movies")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())